@@ -0,0 +1,110 @@
+"""Compare the bytes world4.py sends per interaction: static HTML vs live map.
+
+Usage: python bench_delivery.py [--source PATH_OR_URL] [--attacker NAME] [--target NAME] [--json FILE]
+
+A scripted session (open the world, pick a continent, an attacker and a
+target, edit the name, confirm, toggle full screen, undo) is replayed
+headlessly. For the static path a step costs the whole map page whenever
+the page changes; Streamlit resends an unchanged page by reference only.
+For the live path a step costs the component arguments plus the compressed
+geometry payload the first time the browser sees its URL.
+"""
+import argparse
+import json
+import sys
+
+from campaign import Campaign
+from coloring import map_colors
+from delivery import PayloadStore, args_size, brotli, map_args, map_view, publish_view
+from lod import load_pyramid
+from neighbors import load_adjacency
+from render import build_map, map_html
+from views import WORLD, ViewIndex
+from world_data import SNAPSHOT_DIR, default_source, load_world
+
+
+def session_steps(continent, attacker, target):
+    """Yield ``(label, continent, attacker, target, fullscreen, action)`` for the scripted session."""
+    merged = f"{attacker}-{target}"
+    yield "open world", WORLD, None, None, False, None
+    yield "pick continent", continent, None, None, False, None
+    yield "pick attacker", continent, attacker, None, False, None
+    yield "pick target", continent, attacker, target, False, None
+    yield "edit name", continent, attacker, target, False, None
+    yield "confirm invasion", continent, None, None, False, ("merge", attacker, target, merged)
+    yield "full screen", continent, None, None, True, None
+    yield "pick attacker", continent, merged, None, True, None
+    yield "undo", continent, None, None, True, ("undo",)
+
+
+def run_session(campaign, continent, attacker, target):
+    """Replay the scripted session; return one record per step."""
+    store = PayloadStore()
+    encoding = "br" if brotli is not None else "gzip"
+    view_index = None
+    session = {}
+    sent_key = None
+    seen = set()
+    records = []
+    for label, name, selected, invaded, fullscreen, action in session_steps(continent, attacker, target):
+        if action is not None:
+            campaign.merge(*action[1:]) if action[0] == "merge" else campaign.undo()
+        state = campaign.state
+        view_index = view_index.update(state) if view_index is not None else ViewIndex(state)
+        view = view_index[name]
+        width, height = (1600, 900) if fullscreen else (1200, 800)
+        zoom = view.zoom(width, height)
+
+        # Streamlit re-sends the page when its content or its size changed
+        key = (name, state.version, selected, invaded, zoom, width, height)
+        html = map_html(build_map(state, view, zoom, selected, invaded))
+        static = len(html.encode()) if key != sent_key else 0
+        sent_key = key
+
+        etag = publish_view(store, state, view, zoom)
+        labels = dict.fromkeys([selected, invaded], f"{selected}-{invaded}") if selected and invaded else {}
+        view_key, _ = map_view(session, view, width, height, zoom)
+        args = map_args(f"http://127.0.0.1/{etag}.json", view, view_key, width, height, zoom, [selected, invaded], labels)
+        payload = 0 if etag in seen else store.encoded_size(etag, encoding)
+        seen.add(etag)
+        records.append({
+            "step": label,
+            "static_bytes": static,
+            "live_args_bytes": args_size(args),
+            "live_payload_bytes": payload,
+            "live_bytes": args_size(args) + payload,
+        })
+    return records, encoding
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", help="GeoJSON path or URL (defaults to WORLD_DATA_SOURCE)")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR, help="snapshot cache directory")
+    parser.add_argument("--continent", default="Europe")
+    parser.add_argument("--attacker", default="France")
+    parser.add_argument("--target", default="Spain")
+    parser.add_argument("--json", help="write the per-step results to this file")
+    args = parser.parse_args(argv)
+
+    source = args.source or default_source()
+    world = load_world(source, args.snapshot_dir)
+    adjacency = load_adjacency(world, source, args.snapshot_dir)
+    campaign = Campaign(world, adjacency, load_pyramid(world, source, args.snapshot_dir), map_colors(adjacency))
+    records, encoding = run_session(campaign, args.continent, args.attacker, args.target)
+
+    print(f"{'step':<18} {'static HTML':>12} {'live':>12}  (live payloads {encoding}-compressed)")
+    for record in records:
+        print(f"{record['step']:<18} {record['static_bytes'] / 1024:>9.1f} KB {record['live_bytes'] / 1024:>9.1f} KB")
+    static = sum(record["static_bytes"] for record in records)
+    live = sum(record["live_bytes"] for record in records)
+    print(f"{'total':<18} {static / 1024:>9.1f} KB {live / 1024:>9.1f} KB  ({static / max(live, 1):.1f}x less)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"encoding": encoding, "steps": records}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""Benchmark the world4.py pipeline headlessly, stage by stage.
+
+Usage: python bench_pipeline.py [--resolutions 110m 50m 10m] [--data-dir DIR]
+                                [--source FILE] [--output FILE] [--baseline FILE]
+                                [--profile {cprofile,pyinstrument}]
+
+Stages mirror one world4.py session without Streamlit: load the snapshot,
+filter each continent and take its bounds, build and query the adjacency
+graph, merge countries, build the continent views, and build/serialize the
+folium map with ``render.build_map`` as world4.py does. Each stage
+records wall time and peak RSS; the render stage also records HTML size.
+The detail tiers the maps switch between by zoom are timed too: loading the
+simplified pyramid and encoding each tier's payload, with its size.
+Datasets are read from ``--data-dir`` when present, otherwise from Natural
+Earth once and then from the local snapshot, so repeated runs are offline.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from campaign import Campaign
+from coloring import colors_for, map_colors
+from instrument import peak_rss_mb
+from lod import ZOOM_LEVELS, at_zoom, load_pyramid
+from neighbors import build_adjacency, neighbors_of
+from render import build_map, map_html
+from shapely.ops import unary_union
+from topology import topology
+from views import WORLD, ViewIndex
+from world_data import RESOLUTIONS, SNAPSHOT_DIR, build_snapshot, load_world, resolution_source
+
+# Slowdown relative to the baseline that is reported as a regression
+REGRESSION_THRESHOLD = 1.10
+
+# Merges timed in the merge stage
+MERGE_COUNT = 20
+
+
+def dataset_source(resolution, data_dir):
+    filename = f"ne_{resolution}_admin_0_countries.geojson"
+    path = os.path.join(data_dir, filename)
+    return path if os.path.exists(path) else resolution_source(resolution)
+
+
+class Profiler:
+    """Profile the first run of each stage with cProfile or pyinstrument."""
+
+    def __init__(self, kind, directory):
+        self.kind = kind
+        self.directory = directory
+        if kind:
+            os.makedirs(directory, exist_ok=True)
+
+    def run(self, name, fn):
+        if self.kind == "cprofile":
+            import cProfile
+
+            profile = cProfile.Profile()
+            result = profile.runcall(fn)
+            profile.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+            return result
+        if self.kind == "pyinstrument":
+            from pyinstrument import Profiler as Instrument
+
+            profile = Instrument()
+            profile.start()
+            try:
+                return fn()
+            finally:
+                profile.stop()
+                with open(os.path.join(self.directory, f"{name}.html"), "w") as f:
+                    f.write(profile.output_html())
+        return fn()
+
+
+def _rounded(value):
+    return None if value is None else round(value, 1)
+
+
+def measure(name, fn, repeat, profiler):
+    """Run ``fn`` ``repeat`` times; return its last result and the stage record."""
+    times = []
+    result = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = profiler.run(name, fn) if i == 0 else fn()
+        times.append(time.perf_counter() - start)
+    return result, {
+        "seconds": min(times),
+        "median_seconds": statistics.median(times),
+        "peak_rss_mb": _rounded(peak_rss_mb()),
+    }
+
+
+def merge_pairs(adjacency, count):
+    """Pick attacker/target pairs among the best-connected countries."""
+    pairs = []
+    used = set()
+    for name in sorted(adjacency, key=lambda n: (-len(adjacency[n]), n)):
+        target = next((neighbor for neighbor in sorted(adjacency[name]) if neighbor not in used), None)
+        if name in used or target is None:
+            continue
+        pairs.append((name, target))
+        used.update((name, target))
+        if len(pairs) == count:
+            break
+    return pairs
+
+
+def run_resolution(resolution, source, args, profiler):
+    stages = {}
+    html_bytes = {}
+    prefix = f"{resolution}-"
+
+    if args.cold:
+        _, stages["load_cold"] = measure(prefix + "load_cold", lambda: build_snapshot(source, args.snapshot_dir), 1, profiler)
+    else:
+        load_world(source, args.snapshot_dir)  # make sure the snapshot exists
+    world, stages["load"] = measure(prefix + "load", lambda: load_world(source, args.snapshot_dir), args.repeat, profiler)
+    continents = sorted(world["CONTINENT"].dropna().unique().tolist())
+
+    def filter_all():
+        return {continent: world[world["CONTINENT"] == continent].total_bounds for continent in continents}
+
+    _, stages["filter"] = measure(prefix + "filter", filter_all, args.repeat, profiler)
+
+    adjacency, stages["neighbors_build"] = measure(prefix + "neighbors_build", lambda: build_adjacency(world), args.repeat, profiler)
+
+    def lookup_all():
+        return [neighbors_of(adjacency, name) for name in adjacency]
+
+    _, stages["neighbors_lookup"] = measure(prefix + "neighbors_lookup", lookup_all, args.repeat, profiler)
+
+    pairs = merge_pairs(adjacency, MERGE_COUNT)
+    geometry = dict(zip(world["NAME"], world.geometry.values))
+
+    def union_pairs():
+        return [unary_union([geometry[a], geometry[b]]) for a, b in pairs]
+
+    _, stages["merge_union"] = measure(prefix + "merge_union", union_pairs, args.repeat, profiler)
+
+    load_pyramid(world, source, args.snapshot_dir)  # make sure the levels are cached
+    pyramid, stages["load_pyramid"] = measure(prefix + "load_pyramid", lambda: load_pyramid(world, source, args.snapshot_dir), args.repeat, profiler)
+    coloring = map_colors(adjacency)
+
+    # Payload of the whole world at each detail tier; the last tier is full
+    # resolution, drawn past the deepest pyramid level
+    payload_bytes = {}
+    colors = colors_for(world["NAME"], coloring)
+    for zoom in (*ZOOM_LEVELS, ZOOM_LEVELS[-1] + 1):
+        tier = f"tier_z{zoom}" if zoom in ZOOM_LEVELS else "tier_full"
+        topo, stages[tier] = measure(prefix + tier, lambda: topology(at_zoom(world, pyramid, zoom), colors), args.repeat, profiler)
+        payload_bytes[tier] = len(json.dumps(topo, separators=(",", ":")))
+
+    def campaign_merges():
+        campaign = Campaign(world, adjacency, pyramid, coloring)
+        for a, b in pairs:
+            campaign.merge(a, b, f"{a}-{b}")
+        # Include the deferred unions, which are needed to draw the state
+        return campaign.state.frame()
+
+    _, stages["merge_campaign"] = measure(prefix + "merge_campaign", campaign_merges, args.repeat, profiler)
+
+    state = Campaign(world, adjacency, pyramid, coloring).state
+    view_index, stages["views"] = measure(prefix + "views", lambda: ViewIndex(state), args.repeat, profiler)
+    largest = world["CONTINENT"].value_counts().idxmax()
+    attacker, target = pairs[0] if pairs else (None, None)
+    renders = {
+        "render_world": (WORLD, None, None),
+        "render_continent": (largest, None, None),
+        "render_invasion": (WORLD, attacker, target),
+    }
+    # world4.py's render on a cache miss; as there, the view's payload is
+    # encoded on first use and reused by later renders of the same view
+    for stage, (continent, a, b) in renders.items():
+        view = view_index[continent]
+        zoom = view.zoom(1200, 800)
+        html, stages[stage] = measure(prefix + stage, lambda: map_html(build_map(state, view, zoom, a, b)), args.repeat, profiler)
+        html_bytes[stage] = len(html.encode())
+
+    return {
+        "source": source,
+        "countries": len(world),
+        "continent_rendered": largest,
+        "stages": stages,
+        "html_bytes": html_bytes,
+        "payload_bytes": payload_bytes,
+    }
+
+
+def compare(results, baseline):
+    """Print current/baseline ratios; return the number of regressions."""
+    regressions = 0
+    for resolution, current in results["results"].items():
+        base = baseline.get("results", {}).get(resolution)
+        if not base:
+            continue
+        print(f"\n{resolution} vs baseline")
+        for stage, record in current["stages"].items():
+            before = base["stages"].get(stage, {}).get("seconds")
+            if not before:
+                continue
+            ratio = record["seconds"] / before
+            flag = "  REGRESSION" if ratio > REGRESSION_THRESHOLD else ""
+            regressions += bool(flag)
+            print(f"  {stage:<18} {before * 1000:>9.1f} ms -> {record['seconds'] * 1000:>9.1f} ms  x{ratio:.2f}{flag}")
+        for stage, size in current["html_bytes"].items():
+            before = base.get("html_bytes", {}).get(stage)
+            if before:
+                print(f"  {stage + ' html':<18} {before / 1024:>9.1f} KB -> {size / 1024:>9.1f} KB  x{size / before:.2f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resolutions", nargs="*", choices=RESOLUTIONS, default=RESOLUTIONS)
+    parser.add_argument("--data-dir", default="data", help="directory with local ne_<res>_admin_0_countries.geojson files")
+    parser.add_argument("--source", help="also benchmark this local file, reported under its file name")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR, help="snapshot cache directory")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per stage; the fastest is reported")
+    parser.add_argument("--cold", action="store_true", help="also time rebuilding the snapshot from the source")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit non-zero when a stage regresses")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], help="profile the first run of each stage")
+    parser.add_argument("--profile-dir", default="bench_profiles", help="where profiles are written")
+    args = parser.parse_args(argv)
+
+    profiler = Profiler(args.profile, args.profile_dir)
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {},
+    }
+    sources = [(resolution, dataset_source(resolution, args.data_dir)) for resolution in args.resolutions]
+    if args.source:
+        sources.append((os.path.splitext(os.path.basename(args.source))[0], args.source))
+    for resolution, source in sources:
+        try:
+            result = run_resolution(resolution, source, args, profiler)
+        except Exception as e:
+            print(f"{resolution}: skipped ({e})", file=sys.stderr)
+            continue
+        results["results"][resolution] = result
+        print(f"\n{resolution}: {result['countries']} countries from {source}")
+        for stage, record in result["stages"].items():
+            peak = "" if record["peak_rss_mb"] is None else f"  peak RSS {record['peak_rss_mb']:>7.1f} MB"
+            print(f"  {stage:<18} {record['seconds'] * 1000:>9.1f} ms{peak}")
+        for stage, size in result["html_bytes"].items():
+            print(f"  {stage + ' html':<18} {size / 1024:>9.1f} KB")
+        for tier, size in result["payload_bytes"].items():
+            print(f"  {tier + ' payload':<18} {size / 1024:>9.1f} KB")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
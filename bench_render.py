@@ -0,0 +1,81 @@
+"""Compare map HTML size and build time: per-country layers vs one layer.
+
+Usage: python bench_render.py [--source PATH_OR_URL] [--repeat N]
+"""
+import argparse
+import random
+import time
+
+import folium
+
+from neighbors import build_adjacency
+from render import country_layer
+from world_data import load_world
+
+
+def random_colors(count):
+    return [f"#{random.randint(0, 255):02x}{random.randint(0, 255):02x}{random.randint(0, 255):02x}" for _ in range(count)]
+
+
+def per_row_map(world, colors, highlight=()):
+    """The original rendering: one folium.GeoJson per country."""
+    m = folium.Map(location=[0, 0], zoom_start=2, tiles="cartodb positron")
+    for color, (_, country) in zip(colors, world.iterrows()):
+        highlighted = country['NAME'] in highlight
+        folium.GeoJson(
+            country['geometry'],
+            style_function=lambda x, col="red" if highlighted else color, hl=highlighted: {
+                "fillColor": col,
+                "color": "none" if hl else "black",
+                "weight": 0 if hl else 1,
+                "fillOpacity": 0.7
+            },
+            tooltip=country['NAME']
+        ).add_to(m)
+    return m
+
+
+def single_layer_map(world, colors, highlight=()):
+    m = folium.Map(location=[0, 0], zoom_start=2, tiles="cartodb positron")
+    country_layer(world, colors, highlight=highlight).add_to(m)
+    return m
+
+
+def measure(build, world, colors, highlight, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        html = build(world, colors, highlight).get_root().render()
+        best = min(best, time.perf_counter() - start)
+    return best, len(html.encode())
+
+
+def views(world):
+    """Yield (label, frame, highlight) for the benchmarked views."""
+    yield "World", world, ()
+    for continent in sorted(world['CONTINENT'].unique()):
+        yield continent, world[world['CONTINENT'] == continent], ()
+    adjacency = build_adjacency(world)
+    attacker = max(adjacency, key=lambda name: len(adjacency[name]))
+    target = sorted(adjacency[attacker])[0]
+    yield f"Invasion {attacker}/{target}", world, (attacker, target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", help="GeoJSON path or URL (defaults to WORLD_DATA_SOURCE)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per view, best time is kept")
+    args = parser.parse_args()
+
+    world = load_world(args.source)
+    random.seed(0)
+    print(f"{'view':<32} {'per-row KB':>11} {'per-row ms':>11} {'layer KB':>9} {'layer ms':>9}")
+    for label, frame, highlight in views(world):
+        colors = random_colors(len(frame))
+        row_time, row_size = measure(per_row_map, frame, colors, highlight, args.repeat)
+        layer_time, layer_size = measure(single_layer_map, frame, colors, highlight, args.repeat)
+        print(f"{label:<32} {row_size / 1024:>11.1f} {row_time * 1000:>11.1f} {layer_size / 1024:>9.1f} {layer_time * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""Invasion campaigns as an immutable base world plus a log of merges.
+
+The base snapshot is never copied. Each state in a campaign records only
+the base rows that were merged away and the merged countries that replaced
+them, so applying a merge touches the two affected countries and nothing
+else. States are cached per log prefix, which makes undo and redo cheap,
+and the log itself is what gets saved to a campaign file. Merged geometry
+is not unioned when a merge is applied: a merged country only records its
+base rows, and its union is started in the background and fetched from a
+shared ``UnionCache`` when the state is first drawn.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict, namedtuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from coloring import recolor_merge
+from lod import merge_pyramid
+from neighbors import merge_adjacency
+from unions import UnionCache
+
+# One confirmed invasion: attacker absorbs target under a new name
+Merge = namedtuple("Merge", ["attacker", "target", "name", "continent"])
+
+# A country created by merges; members are the base row positions it covers
+MergedCountry = namedtuple("MergedCountry", ["name", "continent", "members"])
+
+# Materialized states kept per campaign in addition to the base state
+STATE_CACHE_SIZE = 32
+
+# Campaign file format version
+FILE_VERSION = 1
+
+
+def campaign_json(events, position=None):
+    """Serialize a merge log to a campaign file string.
+
+    ``position`` is the number of events applied; by default all of them.
+    """
+    return json.dumps({
+        "version": FILE_VERSION,
+        "position": len(events) if position is None else position,
+        "events": [event._asdict() for event in events],
+    }, indent=2)
+
+
+class WorldState:
+    """The world after some prefix of a campaign's merge log."""
+
+    def __init__(self, base, positions, dropped, merged, adjacency=None, pyramid=None, coloring=None, version="base", unions=None):
+        self.base = base
+        self.positions = positions
+        self.dropped = dropped
+        self.merged = merged
+        self.adjacency = adjacency
+        self.pyramid = pyramid
+        self.coloring = coloring
+        # Hash chain of the applied events, equal for equal logs in any session
+        self.version = version
+        self.unions = unions if unions is not None else UnionCache(base)
+        self._frame = None
+
+    @classmethod
+    def initial(cls, base, adjacency=None, pyramid=None, coloring=None, unions=None):
+        positions = {name: i for i, name in enumerate(base["NAME"].tolist())}
+        return cls(base, positions, frozenset(), {}, adjacency, pyramid, coloring, unions=unions)
+
+    def __contains__(self, name):
+        if name in self.merged:
+            return True
+        position = self.positions.get(name)
+        return position is not None and position not in self.dropped
+
+    def country(self, name):
+        """Return ``(continent, geometry, members)`` for a current country."""
+        if name in self.merged:
+            country = self.merged[name]
+            return country.continent, self.unions.get(country.members), country.members
+        if name not in self:
+            raise KeyError(name)
+        position = self.positions[name]
+        return self.base["CONTINENT"].iat[position], self.base.geometry.values[position], frozenset([position])
+
+    def members(self, name):
+        """Return the base row positions covered by a current country."""
+        if name in self.merged:
+            return self.merged[name].members
+        if name not in self:
+            raise KeyError(name)
+        return frozenset([self.positions[name]])
+
+    def changed_positions(self, other):
+        """Return the base row positions whose country differs in ``other``.
+
+        Both states must share the base world. A position changes when it
+        was merged away in only one of them or when its merged country
+        differs; states derived from one another share every merged country
+        a merge did not touch, so those are compared by identity.
+        """
+        if other.base is not self.base:
+            raise ValueError("States of different base worlds cannot be compared.")
+        positions = set(self.dropped ^ other.dropped)
+        for name in self.merged.keys() | other.merged.keys():
+            before, after = self.merged.get(name), other.merged.get(name)
+            if before is not after:
+                for country in (before, after):
+                    if country is not None:
+                        positions.update(country.members)
+        return positions
+
+    def check(self, attacker, target, name, continent=None):
+        """Validate a merge against this state and return it as a ``Merge``."""
+        for country in (attacker, target):
+            if country not in self:
+                raise ValueError(f"Unknown country: {country}")
+        if attacker == target:
+            raise ValueError("A country cannot invade itself.")
+        if name in self and name not in (attacker, target):
+            raise ValueError(f"A country named {name} already exists.")
+        if continent is None:
+            continent = self.country(attacker)[0]
+        return Merge(attacker, target, name, continent)
+
+    def apply(self, event, prefetch=True):
+        """Return the state after ``event``; this state is left unchanged.
+
+        With ``prefetch`` the merged country's union is started in the
+        background; otherwise it is only computed when first needed.
+        """
+        members = self.members(event.attacker) | self.members(event.target)
+        merged = dict(self.merged)
+        merged.pop(event.attacker, None)
+        merged.pop(event.target, None)
+        merged[event.name] = MergedCountry(event.name, event.continent, members)
+        if prefetch:
+            # Start the exact union now; it is only waited for when drawn
+            self.unions.submit(members)
+        dropped = self.dropped | {
+            self.positions[name] for name in (event.attacker, event.target) if name not in self.merged
+        }
+        adjacency = self.adjacency
+        if adjacency is not None:
+            adjacency = merge_adjacency(adjacency, event.attacker, event.target, event.name)
+        pyramid = self.pyramid
+        if pyramid is not None:
+            pyramid = merge_pyramid(pyramid, event.attacker, event.target, event.name)
+        coloring = self.coloring
+        if coloring is not None and adjacency is not None:
+            coloring = recolor_merge(coloring, adjacency, event.attacker, event.target, event.name)
+        version = hashlib.sha1(json.dumps([self.version, *event]).encode()).hexdigest()[:16]
+        return WorldState(self.base, self.positions, dropped, merged, adjacency, pyramid, coloring, version, self.unions)
+
+    def frame(self):
+        """Return the current world as a GeoDataFrame, built once per state."""
+        if self._frame is None:
+            if not self.dropped and not self.merged:
+                self._frame = self.base
+            else:
+                keep = np.ones(len(self.base), dtype=bool)
+                keep[list(self.dropped)] = False
+                columns = {
+                    "NAME": [country.name for country in self.merged.values()],
+                    "ADMIN": [country.name for country in self.merged.values()],
+                    "CONTINENT": [country.continent for country in self.merged.values()],
+                    "geometry": [future.result() for future in [self.unions.submit(country.members) for country in self.merged.values()]],
+                }
+                rows = gpd.GeoDataFrame(
+                    {column: values for column, values in columns.items() if column in self.base.columns},
+                    crs=self.base.crs,
+                )
+                self._frame = pd.concat([self.base[keep], rows], ignore_index=True)
+        return self._frame
+
+
+class Campaign:
+    """An append-only merge log over a base world, with undo and redo."""
+
+    def __init__(self, base, adjacency=None, pyramid=None, coloring=None, unions=None):
+        self.base = base
+        self.events = []
+        self.position = 0
+        self._states = OrderedDict({0: WorldState.initial(base, adjacency, pyramid, coloring, unions)})
+
+    @property
+    def state(self):
+        return self.state_at(self.position)
+
+    @property
+    def version(self):
+        """Identifier of the current world state."""
+        return self.state.version
+
+    @property
+    def can_undo(self):
+        return self.position > 0
+
+    @property
+    def can_redo(self):
+        return self.position < len(self.events)
+
+    def state_at(self, prefix):
+        """Return the state after the first ``prefix`` events."""
+        if prefix in self._states:
+            self._states.move_to_end(prefix)
+            return self._states[prefix]
+        start = max(cached for cached in self._states if cached < prefix)
+        state = self._states[start]
+        for event in self.events[start:prefix]:
+            state = state.apply(event, prefetch=False)
+        self._remember(prefix, state)
+        return state
+
+    def _remember(self, prefix, state):
+        self._states[prefix] = state
+        while len(self._states) > STATE_CACHE_SIZE + 1:
+            oldest = next(cached for cached in self._states if cached != 0)
+            del self._states[oldest]
+
+    def merge(self, attacker, target, name, continent=None, prefetch=True):
+        """Record an invasion and make it the current state.
+
+        Any undone events after the current position are discarded.
+        """
+        state = self.state
+        event = state.check(attacker, target, name, continent)
+        new_state = state.apply(event, prefetch)
+        del self.events[self.position:]
+        for stale in [cached for cached in self._states if cached > self.position]:
+            del self._states[stale]
+        self.events.append(event)
+        self.position += 1
+        self._remember(self.position, new_state)
+        return event
+
+    def undo(self):
+        if self.can_undo:
+            self.position -= 1
+
+    def redo(self):
+        if self.can_redo:
+            self.position += 1
+
+    def to_json(self):
+        """Serialize the merge log to a campaign file string."""
+        return campaign_json(self.events, self.position)
+
+    def restart(self):
+        """Return an empty campaign over the same base world and caches."""
+        initial = self._states[0]
+        return Campaign(initial.base, initial.adjacency, initial.pyramid, initial.coloring, initial.unions)
+
+    def replay(self, text):
+        """Return a new campaign over the same base world from ``to_json`` output."""
+        data = json.loads(text)
+        if data.get("version") != FILE_VERSION:
+            raise ValueError(f"Unsupported campaign file version: {data.get('version')}")
+        campaign = self.restart()
+        # Intermediate unions are never drawn, so only the final ones are built
+        for event in data["events"]:
+            campaign.merge(**event, prefetch=False)
+        campaign.position = min(data.get("position", len(campaign.events)), len(campaign.events))
+        return campaign
+
+    @classmethod
+    def from_json(cls, text, base, adjacency=None, pyramid=None, coloring=None, unions=None):
+        """Rebuild a campaign from ``to_json`` output over the given base world."""
+        return cls(base, adjacency, pyramid, coloring, unions).replay(text)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            f.write(self.to_json())
+
+    @classmethod
+    def load(cls, path, base, adjacency=None, pyramid=None, coloring=None, unions=None):
+        with open(path) as f:
+            return cls.from_json(f.read(), base, adjacency, pyramid, coloring, unions)
+
+
+class SharedCampaign(Campaign):
+    """A campaign edited by several sessions at once.
+
+    Every read and write of the log goes through one lock, so concurrent
+    merges are applied one after the other and each is validated against
+    the state left by the previous one. States are immutable, so a session
+    can keep drawing the state it read while another session merges.
+    """
+
+    def __init__(self, base, adjacency=None, pyramid=None, coloring=None, unions=None):
+        super().__init__(base, adjacency, pyramid, coloring, unions)
+        self._lock = threading.RLock()
+
+    def state_at(self, prefix):
+        with self._lock:
+            return super().state_at(prefix)
+
+    def merge(self, attacker, target, name, continent=None, prefetch=True):
+        with self._lock:
+            return super().merge(attacker, target, name, continent, prefetch)
+
+    def undo(self):
+        with self._lock:
+            super().undo()
+
+    def redo(self):
+        with self._lock:
+            super().redo()
+
+    def to_json(self):
+        with self._lock:
+            return super().to_json()
+
+    def replay(self, text):
+        """Replace the log with ``to_json`` output in place, so every session sees it."""
+        loaded = super().replay(text)
+        with self._lock:
+            self.events, self.position, self._states = loaded.events, loaded.position, loaded._states
+        return self
@@ -0,0 +1,85 @@
+"""Deterministic country colors.
+
+``stable_colors`` hashes country names in one vectorized pass, so a country
+keeps its color across reruns and sessions. ``map_colors`` runs DSATUR over
+the adjacency graph so neighbors never share a color, and ``recolor_merge``
+updates that coloring for a single merged country without touching the
+rest of the map.
+"""
+import numpy as np
+import pandas as pd
+
+# Map-coloring palette (ColorBrewer Set2); red stays free for highlights
+PALETTE = ["#66c2a5", "#fc8d62", "#8da0cb", "#e78ac3", "#a6d854", "#ffd92f", "#e5c494", "#b3b3b3"]
+
+_HEX = np.array([f"{i:02x}" for i in range(256)], dtype=object)
+
+
+def _hashes(names):
+    # pandas hashes with a fixed key, so values are stable across processes
+    return pd.util.hash_array(np.asarray(names, dtype=object))
+
+
+def stable_colors(names):
+    """Return one ``#rrggbb`` color per name, derived from the name alone."""
+    hashes = _hashes(names)
+    red, green, blue = ((hashes >> shift) & 0xFF for shift in (16, 8, 0))
+    return ("#" + _HEX[red] + _HEX[green] + _HEX[blue]).tolist()
+
+
+def stable_choice(names, options):
+    """Return one item of ``options`` per name, derived from the name alone."""
+    return np.asarray(options, dtype=object)[_hashes(names) % len(options)].tolist()
+
+
+def _first_free(used, palette):
+    for color in palette:
+        if color not in used:
+            return color
+    return None
+
+
+def map_colors(adjacency, palette=PALETTE):
+    """Color the adjacency graph with DSATUR; returns ``{name: color}``.
+
+    The most constrained country is colored first, ties broken by degree
+    and then name so the result is deterministic. A country whose neighbors
+    already use the whole palette falls back to its stable hash color.
+    """
+    coloring = {}
+    saturation = {name: set() for name in adjacency}
+    uncolored = set(adjacency)
+    while uncolored:
+        name = max(uncolored, key=lambda n: (len(saturation[n]), len(adjacency[n]), n))
+        uncolored.remove(name)
+        color = _first_free(saturation[name], palette) or stable_colors([name])[0]
+        coloring[name] = color
+        for neighbor in adjacency[name]:
+            if neighbor in saturation:
+                saturation[neighbor].add(color)
+    return coloring
+
+
+def recolor_merge(coloring, adjacency, attacker, target, new_name, palette=PALETTE):
+    """Return a coloring with the two countries replaced by ``new_name``.
+
+    ``adjacency`` is the graph after the merge. The merged country keeps the
+    attacker's color when no neighbor uses it; no other country changes.
+    """
+    updated = dict(coloring)
+    preferred = updated.pop(attacker, None)
+    updated.pop(target, None)
+    used = {updated[neighbor] for neighbor in adjacency.get(new_name, ()) if neighbor in updated}
+    candidates = ([preferred] if preferred else []) + list(palette)
+    updated[new_name] = _first_free(used, candidates) or stable_colors([new_name])[0]
+    return updated
+
+
+def colors_for(names, coloring):
+    """Look up a color per name, using stable colors for names not in ``coloring``."""
+    names = list(names)
+    colors = [coloring.get(name) for name in names]
+    if None in colors:
+        fallback = stable_colors(names)
+        colors = [color or default for color, default in zip(colors, fallback)]
+    return colors
@@ -0,0 +1,231 @@
+"""Incremental map delivery for the Streamlit apps.
+
+``st.iframe`` (like ``folium_static``) embeds the whole map page in
+the Streamlit message, so every rerun that changes the highlight re-sends
+and re-parses every geometry in a fresh iframe. Here the TopoJSON payload
+of a view is published once under a content-addressed URL by a small local
+HTTP endpoint, compressed and cached by the browser for good. The map is a
+Streamlit component whose iframe stays mounted across reruns: a rerun only
+sends the payload URL, the view and the highlighted countries, and the page
+restyles its existing layer in place. Geometry is fetched again only when
+the URL changes, i.e. for another continent, zoom level or campaign state.
+
+The map reports its zoom back when the user zooms across a level of the
+geometry pyramid, so the next rerun publishes that level: wide views stay
+on coarse geometry and zoomed views get the fine one.
+
+The endpoint listens on its own port, so browsers not running on the
+Streamlit host only reach it through ``WORLD_PAYLOAD_URL``, for example a
+reverse proxy path forwarding to it; static HTML stays the apps' default.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+
+import streamlit.components.v1 as components
+
+from endpoint import Endpoint, Handler
+from lod import ZOOM_LEVELS, level_for_zoom
+from lru import LRUCache
+from render import style_country
+from topology import OBJECT_NAME
+from views import WORLD
+
+try:
+    import brotli
+except ImportError:  # Payloads are then served gzip-compressed only
+    brotli = None
+
+# Address the payload endpoint listens on
+PAYLOAD_HOST = os.environ.get("WORLD_PAYLOAD_HOST", "127.0.0.1")
+PAYLOAD_PORT = int(os.environ.get("WORLD_PAYLOAD_PORT", "0"))
+
+# Base URL browsers fetch payloads from; defaults to the listening address,
+# which only a browser on the server itself can reach
+PAYLOAD_URL = os.environ.get("WORLD_PAYLOAD_URL")
+
+# Default size budget for published payloads, all encodings included, in bytes
+PAYLOAD_CACHE_SIZE = 128 * 1024 * 1024
+
+BROTLI_QUALITY = 9
+
+# Base map drawn under the countries, as in the folium maps
+BASEMAP = "https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png"
+ATTRIBUTION = '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors &copy; <a href="https://carto.com/attributions">CARTO</a>'
+
+_PAYLOAD_PATH = re.compile(r"^/(\w+)\.json$")
+
+# Frontend of the live map, a static page needing no build step
+COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "map_component")
+
+_component = None
+
+
+def _encodings(data):
+    bodies = {"identity": data, "gzip": gzip.compress(data, compresslevel=6, mtime=0)}
+    if brotli is not None:
+        bodies["br"] = brotli.compress(data, quality=BROTLI_QUALITY)
+    return bodies
+
+
+def _accepted(header):
+    return {token.split(";")[0].strip().lower() for token in (header or "").split(",")}
+
+
+class PayloadStore(LRUCache):
+    """Thread-safe LRU of published payloads, addressed by the hash of their JSON.
+
+    Every payload is kept in each encoding the server can send, so requests
+    never compress anything. One instance is meant to be shared by every
+    session of a Streamlit server.
+    """
+
+    def __init__(self, max_size=PAYLOAD_CACHE_SIZE):
+        super().__init__(max_size)
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self._etags = {}
+
+    def publish(self, key, build):
+        """Return the ETag of the payload for ``key``, encoding ``build()`` on a miss."""
+        etag = self._etags.get(key)
+        if self.get(etag) is not None:
+            return etag
+        # Serialize and compress outside the lock so other sessions are not blocked
+        data = json.dumps(build(), separators=(",", ":")).encode()
+        etag = hashlib.sha1(data).hexdigest()[:16]
+        bodies = _encodings(data)
+        with self._lock:
+            self._etags[key] = etag
+            self.put(etag, bodies, sum(len(body) for body in bodies.values()))
+        return etag
+
+    def evicted(self, etag, bodies):
+        self._etags = {key: value for key, value in self._etags.items() if value != etag}
+
+    def body(self, etag, accept_encoding=None):
+        """Return ``(encoding, data)`` of a payload in the best accepted encoding, or None."""
+        bodies = self.peek(etag)
+        if bodies is None:
+            return None
+        accepted = _accepted(accept_encoding)
+        encoding = next((name for name in ("br", "gzip") if name in bodies and name in accepted), "identity")
+        return encoding, bodies[encoding]
+
+    def record(self, sent):
+        """Count one request that sent ``sent`` bytes, or None for a 304."""
+        with self._lock:
+            self.requests += 1
+            self.not_modified += sent is None
+            self.bytes_sent += sent or 0
+
+    def encoded_size(self, etag, encoding="gzip"):
+        """Return the bytes a browser accepting ``encoding`` downloads for a payload."""
+        found = self.body(etag, encoding)
+        return len(found[1]) if found is not None else 0
+
+
+class _PayloadHandler(Handler):
+    # The URL names the content, so browsers may keep it indefinitely
+    cache_control = "public, max-age=31536000, immutable"
+    vary = "Accept-Encoding"
+
+    def do_GET(self):
+        store = self.server.store
+        match = _PAYLOAD_PATH.match(self.path.split("?")[0])
+        found = store.body(match.group(1), self.headers.get("Accept-Encoding")) if match else None
+        if found is None:
+            self.send_error(404)
+            return
+        encoding, data = found
+        self.send_body(match.group(1), data, "application/json", encoding)
+
+    def sending(self, size):
+        self.server.store.record(size)
+
+
+class PayloadServer(Endpoint):
+    """Serve the payloads of a ``PayloadStore`` over HTTP from a background thread.
+
+    ``public_url`` is the base URL browsers use to reach the server, when it
+    differs from the address it listens on.
+    """
+
+    def __init__(self, store, host=PAYLOAD_HOST, port=PAYLOAD_PORT, public_url=PAYLOAD_URL):
+        super().__init__(_PayloadHandler, host, port, public_url, store=store)
+        self.store = store
+
+    def url(self, etag):
+        return f"{self.base_url}/{etag}.json"
+
+
+def publish_view(store, state, view, zoom):
+    """Publish the unhighlighted payload of ``view`` at ``zoom``; return its ETag."""
+    key = (id(state.base), state.version, view.name, level_for_zoom(zoom))
+    return store.publish(key, lambda: view.payload(state, zoom))
+
+
+def map_view(session, view, width, height, zoom, key="world_map"):
+    """Return ``(view key, zoom)`` for this rerun of the live map.
+
+    ``session`` is the Streamlit session state. The key changes whenever the
+    view does, even back to an earlier one, so the map refits and a zoom it
+    reported for an older view is ignored. ``zoom`` is the fitted zoom, used
+    until the map reports another one.
+    """
+    name = f"{view.name}:{width}x{height}"
+    last = session.get("map_view")
+    if last is None or last[0] != name:
+        last = session["map_view"] = (name, last[1] + 1 if last else 0)
+    view_key = f"{name}#{last[1]}"
+    value = session.get(key)
+    if isinstance(value, dict) and value.get("view") == view_key:
+        zoom = value["zoom"]
+    return view_key, zoom
+
+
+def map_args(payload_url, view, view_key, width, height, zoom, highlight=(), labels=None, name_field="NAME"):
+    """Return the arguments one rerun sends to the live map.
+
+    ``zoom`` is the zoom the payload was published for. ``labels`` renames
+    countries in the tooltip, e.g. to preview the name of a pending merge.
+    """
+    base = style_country({"properties": {"highlight": False, "fill": None}})
+    base.pop("fillColor")
+    bounds = view.bounds
+    return {
+        "payload": payload_url,
+        "object": OBJECT_NAME,
+        "name_field": name_field,
+        "view": view_key,
+        "bounds": None if view.name == WORLD else [[bounds[1], bounds[0]], [bounds[3], bounds[2]]],
+        "center": list(view.center),
+        "zoom": 2,
+        "levels": list(ZOOM_LEVELS),
+        "payload_level": level_for_zoom(zoom),
+        "width": width,
+        "height": height,
+        "basemap": BASEMAP,
+        "attribution": ATTRIBUTION,
+        "styles": {"base": base, "highlight": style_country({"properties": {"highlight": True}})},
+        "highlight": sorted(name for name in highlight if name),
+        "labels": {name: label for name, label in (labels or {}).items() if name},
+    }
+
+
+def args_size(args):
+    """Return the bytes of the component arguments in the rerun's message."""
+    return len(json.dumps(args, separators=(",", ":")).encode())
+
+
+def live_map(args, key="world_map"):
+    """Draw or update the live map; the iframe is kept while ``key`` is stable."""
+    global _component
+    # Declared on first use, inside a script run, so importing this module
+    # from the command-line tools needs no Streamlit runtime
+    if _component is None:
+        _component = components.declare_component("world_map", path=COMPONENT_DIR)
+    return _component(**args, key=key, default=None)
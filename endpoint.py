@@ -0,0 +1,67 @@
+"""Small HTTP endpoints served next to Streamlit from a background thread.
+
+The live map's payloads and the vector tiles are served by Python's
+threading HTTP server. ``Endpoint`` runs one and knows the URL browsers
+reach it under; ``Handler`` answers conditional requests for content
+named by an ETag.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Request handler sending ETag-validated bodies, without request logging."""
+
+    # Headers sent with every body or 304
+    cache_control = "no-cache"
+    vary = None
+
+    def send_body(self, etag, data, content_type, encoding=None):
+        """Send ``data``, or a 304 when the client already has ``etag``."""
+        etag = f'"{etag}"'
+        unchanged = self.headers.get("If-None-Match") == etag
+        self.sending(None if unchanged else len(data))
+        self.send_response(304 if unchanged else 200)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", self.cache_control)
+        self.send_header("ETag", etag)
+        if self.vary:
+            self.send_header("Vary", self.vary)
+        if unchanged:
+            self.end_headers()
+            return
+        self.send_header("Content-Type", content_type)
+        if encoding and encoding != "identity":
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def sending(self, size):
+        """Called before a response goes out with the body's bytes, or None for a 304."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Endpoint:
+    """Serve ``handler`` from a daemon thread.
+
+    Keyword arguments become attributes of the server, where handlers find
+    them as ``self.server.<name>``. ``public_url`` is the base URL browsers
+    use when it differs from the address the server listens on.
+    """
+
+    def __init__(self, handler, host, port, public_url=None, **attributes):
+        self.host = host
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        for name, value in attributes.items():
+            setattr(self._httpd, name, value)
+        self.port = self._httpd.server_address[1]
+        self.base_url = (public_url or f"http://{host}:{self.port}").rstrip("/")
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
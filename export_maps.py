@@ -0,0 +1,178 @@
+"""Export static maps for every continent and zoom level in one run.
+
+Usage: python export_maps.py [--out DIR] [--formats html geojson topojson] [--zooms 2 4 6]
+                             [--views World Europe ...] [--workers N] [--force]
+
+Each (view, zoom, format) variant is rendered in a process pool; every
+worker loads the world snapshot once. A manifest of input hashes lets a
+re-run skip outputs whose data and rendering code have not changed.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import folium
+
+from coloring import colors_for, map_colors
+from lod import ZOOM_LEVELS, at_zoom, load_pyramid
+from neighbors import load_adjacency
+from render import feature_collection, map_html
+from topology import topojson_layer, topology
+from world_data import SNAPSHOT_DIR, default_source, load_world, read_meta
+
+# Modules whose code affects the exported output
+CODE_FILES = ["export_maps.py", "render.py", "topology.py", "lod.py", "coloring.py", "neighbors.py", "world_data.py"]
+
+FORMATS = {"html": "html", "geojson": "geojson", "topojson": "topojson"}
+
+MANIFEST = "manifest.json"
+
+# World data for this worker process, loaded once by _init_worker
+_worker = {}
+
+
+def slug(view):
+    return "".join(c if c.isalnum() else "-" for c in view.lower()).strip("-").replace("--", "-")
+
+
+def view_frame(world, view):
+    """Return the countries shown in a view ("World" or a continent name)."""
+    return world if view == "World" else world[world["CONTINENT"] == view]
+
+
+def view_center(frame, view):
+    if view == "World":
+        return [0, 0]
+    bounds = frame.total_bounds
+    return [(bounds[1] + bounds[3]) / 2, (bounds[0] + bounds[2]) / 2]
+
+
+def code_hash():
+    digest = hashlib.sha256()
+    base = os.path.dirname(os.path.abspath(__file__))
+    for name in CODE_FILES:
+        path = os.path.join(base, name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_inputs(source, snapshot_dir):
+    """Load the world with its pyramid and map coloring."""
+    world = load_world(source, snapshot_dir)
+    pyramid = load_pyramid(world, source, snapshot_dir)
+    coloring = map_colors(load_adjacency(world, source, snapshot_dir))
+    return world, pyramid, coloring
+
+
+def _init_worker(source, snapshot_dir):
+    _worker["world"], _worker["pyramid"], _worker["coloring"] = load_inputs(source, snapshot_dir)
+
+
+def render_variant(world, pyramid, coloring, view, zoom, fmt):
+    """Return the exported document for one variant as a string."""
+    frame = view_frame(world, view)
+    colors = colors_for(frame["NAME"], coloring)
+    frame = at_zoom(frame, pyramid, zoom)
+    if fmt == "geojson":
+        return json.dumps(feature_collection(frame, colors), separators=(",", ":"))
+    topo = topology(frame, colors)
+    if fmt == "topojson":
+        return json.dumps(topo, separators=(",", ":"))
+    m = folium.Map(location=view_center(frame, view), zoom_start=zoom, tiles="cartodb positron")
+    topojson_layer(topo).add_to(m)
+    return map_html(m)
+
+
+def _export(task):
+    view, zoom, fmt, path = task
+    start = time.perf_counter()
+    document = render_variant(_worker["world"], _worker["pyramid"], _worker["coloring"], view, zoom, fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        f.write(document)
+    os.replace(path + ".tmp", path)
+    return path, len(document), time.perf_counter() - start
+
+
+def plan(out, views, zooms, formats, inputs_key):
+    """Return ``[(task, input_hash)]`` for every requested variant."""
+    tasks = []
+    for view in views:
+        for zoom in zooms:
+            for fmt in formats:
+                path = os.path.join(out, slug(view), f"z{zoom}.{FORMATS[fmt]}")
+                input_hash = hashlib.sha256(json.dumps([inputs_key, view, zoom, fmt]).encode()).hexdigest()
+                tasks.append(((view, zoom, fmt, path), input_hash))
+    return tasks
+
+
+def read_manifest(out):
+    try:
+        with open(os.path.join(out, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(out, manifest):
+    path = os.path.join(out, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", help="GeoJSON path or URL (defaults to WORLD_DATA_SOURCE)")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR, help="snapshot cache directory")
+    parser.add_argument("--out", default="exports", help="output directory")
+    parser.add_argument("--formats", nargs="+", choices=sorted(FORMATS), default=sorted(FORMATS))
+    parser.add_argument("--zooms", nargs="+", type=int, default=list(ZOOM_LEVELS))
+    parser.add_argument("--views", nargs="+", help="views to export (default: World and every continent)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="re-export even when inputs are unchanged")
+    args = parser.parse_args(argv)
+
+    source = args.source or default_source()
+    start = time.perf_counter()
+    # Build the snapshot and its caches here so workers only read them
+    world, _, _ = load_inputs(source, args.snapshot_dir)
+    views = args.views or ["World"] + sorted(world["CONTINENT"].dropna().unique().tolist())
+    inputs_key = [read_meta(source, args.snapshot_dir)["snapshot_sha256"], code_hash()]
+
+    manifest = {} if args.force else read_manifest(args.out)
+    tasks = plan(args.out, views, args.zooms, args.formats, inputs_key)
+    pending = [(task, input_hash) for task, input_hash in tasks
+               if manifest.get(os.path.relpath(task[3], args.out)) != input_hash or not os.path.exists(task[3])]
+    print(f"{len(tasks)} variants, {len(tasks) - len(pending)} unchanged, {len(pending)} to export")
+
+    hashes = {task[3]: input_hash for task, input_hash in pending}
+    failed = 0
+    if pending:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(source, args.snapshot_dir)) as pool:
+            futures = [pool.submit(_export, task) for task, _ in pending]
+            for future in as_completed(futures):
+                try:
+                    path, size, seconds = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"Export failed: {e}", file=sys.stderr)
+                    continue
+                manifest[os.path.relpath(path, args.out)] = hashes[path]
+                print(f"{path}  {size / 1024:.1f} KB  {seconds * 1000:.0f} ms")
+        os.makedirs(args.out, exist_ok=True)
+        write_manifest(args.out, manifest)
+
+    print(f"Done in {time.perf_counter() - start:.1f} s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Per-rerun instrumentation for the Streamlit apps.
+
+A ``Trace`` collects what one script run spent: timing spans around the
+pipeline stages, counters such as cache hits and misses, and values such as
+GeoDataFrame memory or the bytes of the map sent. Finished traces are kept
+for the debug panel and, when ``WORLD_TRACE_LOG`` names a file, appended to
+it as one JSON line each, so logs of several server processes can be
+concatenated and aggregated.
+
+When instrumentation is off the apps use ``NULL_TRACE``, whose methods do
+nothing and whose spans are one shared no-op context manager, so the cost
+is a method call per stage.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak RSS is then not recorded
+    resource = None
+
+from memory import geometry_size
+
+# JSON-lines file every finished trace is appended to, if set
+TRACE_LOG = os.environ.get("WORLD_TRACE_LOG")
+
+_log_lock = threading.Lock()
+
+
+def frame_bytes(frame):
+    """Estimate the bytes of a GeoDataFrame, attribute columns and geometries included."""
+    size = int(frame.drop(columns="geometry").memory_usage(index=True, deep=True).sum())
+    return size + geometry_size(frame.geometry.values)
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB, or None."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        spans = self.trace.spans
+        spans[self.name] = spans.get(self.name, 0.0) + seconds
+        return False
+
+
+class Trace:
+    """Timings, counters and values of one script run."""
+
+    def __init__(self, log=TRACE_LOG, **context):
+        self.log = log
+        self.context = context
+        self.spans = {}
+        self.counters = {}
+        self.values = {}
+        self.finished = None
+        self._watched = {}
+        self._start = time.perf_counter()
+
+    def span(self, name):
+        """Return a context manager adding its wall time to span ``name``."""
+        return _Span(self, name)
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, name, value):
+        self.values[name] = value
+
+    def watch(self, name, cache):
+        """Count the hits and misses ``cache`` sees from now until the trace finishes.
+
+        Shared caches also count other sessions' lookups made meanwhile.
+        """
+        if cache is not None and name not in self._watched:
+            self._watched[name] = (cache, cache.hits, cache.misses)
+
+    def finish(self):
+        """Close the trace, append it to the log and return it as a dict.
+
+        Later calls return the same record, so a run that ends early (for
+        example with ``st.rerun``) can finish its trace before stopping.
+        """
+        if self.finished is not None:
+            return self.finished
+        for name, (cache, hits, misses) in self._watched.items():
+            self.count(f"{name}.hits", cache.hits - hits)
+            self.count(f"{name}.misses", cache.misses - misses)
+        self.finished = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            **self.context,
+            "total_seconds": time.perf_counter() - self._start,
+            "spans": self.spans,
+            "counters": self.counters,
+            "values": {**self.values, "peak_rss_mb": peak_rss_mb()},
+        }
+        if self.log:
+            line = json.dumps(self.finished, default=str) + "\n"
+            with _log_lock, open(self.log, "a") as f:
+                f.write(line)
+        return self.finished
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _NullTrace:
+    """Trace that records nothing, used when instrumentation is off."""
+
+    _span = _NullSpan()
+    finished = None
+
+    def span(self, name):
+        return self._span
+
+    def count(self, name, amount=1):
+        pass
+
+    def record(self, name, value):
+        pass
+
+    def watch(self, name, cache):
+        pass
+
+    def finish(self):
+        return None
+
+
+NULL_TRACE = _NullTrace()
+
+
+def to_json_lines(records):
+    """Serialize finished traces as JSON lines."""
+    return "".join(json.dumps(record, default=str) + "\n" for record in records)
@@ -0,0 +1,116 @@
+"""Zoom-dependent level-of-detail pyramid for country geometries.
+
+Each level is simplified with ``shapely.coverage_simplify`` so the shared
+border between two neighbors is simplified once and both countries keep
+the same edge, leaving no gaps. Levels are cached next to the snapshot
+and picked from the map's zoom when rendering.
+"""
+import math
+import os
+
+import geopandas as gpd
+import shapely
+
+from world_data import SNAPSHOT_DIR, default_source, read_meta, read_snapshot, snapshot_paths
+
+# Zoom levels that get a simplified copy; deeper zooms use full resolution
+ZOOM_LEVELS = (2, 4, 6)
+
+# Simplification tolerance in screen pixels
+PIXEL_TOLERANCE = 1.0
+
+
+def tolerance_for_zoom(zoom):
+    """Return the simplification tolerance in degrees for a zoom level."""
+    return 360 / (256 * 2 ** zoom) * PIXEL_TOLERANCE
+
+
+def level_for_zoom(zoom):
+    """Return the pyramid level to draw at ``zoom``, or None for full resolution."""
+    for level in ZOOM_LEVELS:
+        if zoom <= level:
+            return level
+    return None
+
+
+def _mercator_y(lat):
+    lat = max(min(lat, 85.0511), -85.0511)
+    return math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+
+def zoom_for_bounds(bounds, width, height):
+    """Return the zoom Leaflet's ``fit_bounds`` picks for ``bounds`` in a map of this size."""
+    minx, miny, maxx, maxy = bounds
+    lon_span = max(maxx - minx, 1e-9)
+    lat_span = max(_mercator_y(maxy) - _mercator_y(miny), 1e-9)
+    zoom = min(math.log2(width * 360 / (256 * lon_span)), math.log2(height * 2 * math.pi / (256 * lat_span)))
+    return max(0, min(18, math.floor(zoom)))
+
+
+def build_pyramid(world):
+    """Return ``{level: {name: simplified geometry}}`` for every pyramid level."""
+    names = world["NAME"].tolist()
+    geoms = world.geometry.values
+    return {
+        level: dict(zip(names, shapely.coverage_simplify(geoms, tolerance_for_zoom(level))))
+        for level in ZOOM_LEVELS
+    }
+
+
+def _pyramid_path(source, snapshot_dir, snapshot_sha256):
+    parquet_path = snapshot_paths(source, snapshot_dir)[0]
+    return parquet_path[: -len(".parquet")] + f".{snapshot_sha256[:16]}.lod.parquet"
+
+
+def load_pyramid(world, source=None, snapshot_dir=SNAPSHOT_DIR):
+    """Return the pyramid for the snapshot ``world`` was loaded from.
+
+    The pyramid file name carries the snapshot hash, so a rebuilt snapshot
+    never picks up levels simplified from older geometry.
+    """
+    source = source or default_source()
+    snapshot_sha256 = (read_meta(source, snapshot_dir) or {}).get("snapshot_sha256")
+    path = _pyramid_path(source, snapshot_dir, snapshot_sha256) if snapshot_sha256 else None
+    if path and os.path.exists(path):
+        levels = read_snapshot(path)
+        names = levels["NAME"].tolist()
+        return {level: dict(zip(names, levels[f"z{level}"].values)) for level in ZOOM_LEVELS}
+
+    pyramid = build_pyramid(world)
+    if path:
+        names = world["NAME"].tolist()
+        columns = {f"z{level}": gpd.GeoSeries([pyramid[level][name] for name in names], crs=world.crs) for level in ZOOM_LEVELS}
+        levels = gpd.GeoDataFrame({"NAME": names, **columns}, geometry=f"z{ZOOM_LEVELS[0]}")
+        levels.to_parquet(path + ".tmp", index=False, compression="zstd")
+        os.replace(path + ".tmp", path)
+    return pyramid
+
+
+def merge_pyramid(pyramid, attacker, target, new_name):
+    """Return a new pyramid with the two countries merged into ``new_name``.
+
+    Each level's merged geometry is the union of the two simplified pieces,
+    which share their simplified border, so the result stays aligned with
+    the surrounding countries.
+    """
+    merged = {}
+    for level, geoms in pyramid.items():
+        geoms = dict(geoms)
+        parts = [geom for geom in (geoms.pop(attacker, None), geoms.pop(target, None)) if geom is not None]
+        if parts:
+            geoms[new_name] = shapely.union_all(parts)
+        merged[level] = geoms
+    return merged
+
+
+def at_zoom(world, pyramid, zoom):
+    """Return ``world`` with geometries swapped for the level matching ``zoom``.
+
+    Countries missing from the pyramid keep their full-resolution geometry.
+    """
+    level = level_for_zoom(zoom)
+    if pyramid is None or level is None:
+        return world
+    geoms = pyramid[level]
+    simplified = [geoms.get(name, geom) for name, geom in zip(world["NAME"], world.geometry.values)]
+    return world.set_geometry(gpd.GeoSeries(simplified, index=world.index, crs=world.crs))
@@ -0,0 +1,132 @@
+"""Thread-safe LRU caches bounded by the total size of their values.
+
+The render, payload, tile and union caches all keep entries up to a size
+budget and drop the least recently used ones beyond it. ``LRUCache`` is
+that shared part; each cache subclasses it and decides what an entry's
+size is measured in (characters, bytes or vertices).
+"""
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Mapping that evicts least recently used entries beyond ``max_size``.
+
+    An entry put with size None is never evicted until ``resize`` gives it
+    a size, which lets a cache hold values still being computed. ``hits``
+    and ``misses`` count ``get`` lookups. The lock is reentrant, so
+    subclasses can hold it around several calls.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Return the value for ``key`` and mark it used, counting a hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key, default=None):
+        """Return the value for ``key`` without marking it used or counting it."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return default if entry is None else entry[0]
+
+    def touch(self, key):
+        """Mark ``key`` as recently used without counting a lookup."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def items(self):
+        """Return a snapshot of the ``(key, value)`` pairs, least recently used first."""
+        with self._lock:
+            return [(key, value) for key, (value, _) in self._entries.items()]
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def put(self, key, value, size=None):
+        """Store ``value`` unless ``key`` is present or it exceeds the budget.
+
+        Return whether it was stored.
+        """
+        with self._lock:
+            if key in self._entries or (size is not None and size > self.max_size):
+                return False
+            self._entries[key] = (value, size)
+            if size is not None:
+                self.size += size
+                self._evict()
+            return True
+
+    def resize(self, key, size):
+        """Give a value put without a size its size, evicting others if needed."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is None:
+                self._entries[key] = (entry[0], size)
+                self.size += size
+                self._evict()
+
+    def get_or_build(self, key, build, sizeof=len):
+        """Return the value for ``key``, calling ``build()`` on a miss.
+
+        ``build`` runs outside the lock, so other threads are not blocked.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = build()
+            self.put(key, value, sizeof(value))
+        return value
+
+    def discard(self, keys):
+        """Remove ``keys`` where present; return the number removed."""
+        removed = 0
+        with self._lock:
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self.size -= entry[1] or 0
+                    removed += 1
+        return removed
+
+    def clear(self):
+        """Remove every entry; return the number removed."""
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self.size = 0
+        return removed
+
+    def evicted(self, key, value):
+        """Called with the lock held for every entry evicted over the budget."""
+
+    def _evict(self):
+        while self.size > self.max_size:
+            key = next((key for key, (_, size) in self._entries.items() if size is not None), None)
+            if key is None:
+                break
+            value, size = self._entries.pop(key)
+            self.size -= size
+            self.evicted(key, value)
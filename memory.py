@@ -0,0 +1,65 @@
+"""Memory accounting for sessions that share one base world.
+
+Sizes are estimates from ``sys.getsizeof`` over the object graph. Shapely
+geometries are never counted per session: they belong to the shared base
+world or to the shared union cache. DataFrames count their column arrays,
+which for object and geometry columns means one pointer per row.
+"""
+import sys
+
+import pandas as pd
+import shapely
+
+
+def _frame_size(frame):
+    return int(frame.memory_usage(index=True, deep=False).sum())
+
+
+def _walk(roots, skip):
+    """Yield every object reachable from ``roots`` once, not entering ``skip`` ids."""
+    seen = set(skip)
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (shapely.Geometry, type)):
+            continue
+        seen.add(id(obj))
+        yield obj
+        if isinstance(obj, (pd.DataFrame, pd.Series)):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, "__dict__"):
+            stack.append(obj.__dict__)
+
+
+def shared_ids(*roots):
+    """Return the ids of everything reachable from objects shared by all sessions."""
+    return {id(obj) for obj in _walk(roots, ())}
+
+
+def deep_size(obj, shared=()):
+    """Return the bytes held by ``obj`` that are not part of ``shared`` ids."""
+    return sum(
+        _frame_size(item) if isinstance(item, pd.DataFrame) else sys.getsizeof(item)
+        for item in _walk([obj], shared)
+    )
+
+
+def geometry_size(geoms):
+    """Estimate the bytes of shapely geometries from their vertex count."""
+    return int(shapely.get_num_coordinates(list(geoms)).sum()) * 16
+
+
+def shared_size(base, pyramid=None, unions=None):
+    """Estimate the bytes held once per process for the base world and its caches."""
+    size = int(base.drop(columns="geometry").memory_usage(index=True, deep=True).sum())
+    size += geometry_size(base.geometry.values)
+    for level in (pyramid or {}).values():
+        size += geometry_size(level.values())
+    if unions is not None:
+        size += unions.coords * 16
+    return size
@@ -0,0 +1,85 @@
+"""Country adjacency graph.
+
+The graph maps each country NAME to the set of neighbouring NAMEs. It is
+built once per snapshot with an STRtree bounding-box prefilter followed by
+the exact predicate, cached next to the snapshot, and updated per invasion
+without touching any geometry.
+"""
+import json
+import os
+
+from shapely import STRtree
+
+from world_data import SNAPSHOT_DIR, default_source, read_meta, snapshot_paths
+
+
+def build_adjacency(world, predicate="intersects"):
+    """Return ``{name: set(neighbor names)}`` for every country in ``world``."""
+    names = world["NAME"].tolist()
+    geoms = world.geometry.values
+    left, right = STRtree(geoms).query(geoms, predicate=predicate)
+    adjacency = {name: set() for name in names}
+    for i, j in zip(left.tolist(), right.tolist()):
+        if i != j:
+            adjacency[names[i]].add(names[j])
+    return adjacency
+
+
+def _adjacency_path(source, snapshot_dir, predicate):
+    parquet_path = snapshot_paths(source, snapshot_dir)[0]
+    return parquet_path[: -len(".parquet")] + f".{predicate}.adjacency.json"
+
+
+def load_adjacency(world, source=None, snapshot_dir=SNAPSHOT_DIR, predicate="intersects"):
+    """Return the adjacency graph for the snapshot ``world`` was loaded from.
+
+    The graph is read from disk when it was built for the current snapshot
+    hash, otherwise it is rebuilt from ``world`` and saved.
+    """
+    source = source or default_source()
+    meta = read_meta(source, snapshot_dir) or {}
+    snapshot_sha256 = meta.get("snapshot_sha256")
+    path = _adjacency_path(source, snapshot_dir, predicate)
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        if snapshot_sha256 and cached.get("snapshot_sha256") == snapshot_sha256:
+            return {name: set(neighbors) for name, neighbors in cached["adjacency"].items()}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    adjacency = build_adjacency(world, predicate)
+    if snapshot_sha256:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump({
+                "snapshot_sha256": snapshot_sha256,
+                "adjacency": {name: sorted(neighbors) for name, neighbors in adjacency.items()},
+            }, f)
+        os.replace(path + ".tmp", path)
+    return adjacency
+
+
+def merge_adjacency(adjacency, attacker, target, new_name):
+    """Return a new graph with ``attacker`` and ``target`` merged into ``new_name``.
+
+    The merged node inherits the union of both neighbor sets. Only the sets
+    of the affected neighbors are copied; the input graph is left unchanged
+    so it can be shared between sessions.
+    """
+    merged = (adjacency.get(attacker, set()) | adjacency.get(target, set())) - {attacker, target, new_name}
+    updated = dict(adjacency)
+    updated.pop(attacker, None)
+    updated.pop(target, None)
+    for name in merged:
+        updated[name] = (updated[name] - {attacker, target}) | {new_name}
+    updated[new_name] = merged
+    return updated
+
+
+def neighbors_of(adjacency, name, within=None):
+    """Return the sorted neighbors of ``name``, optionally limited to ``within``."""
+    neighbors = adjacency.get(name, ())
+    if within is not None:
+        neighbors = [neighbor for neighbor in neighbors if neighbor in within]
+    return sorted(neighbors)
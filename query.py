@@ -0,0 +1,144 @@
+"""Point-in-country and bounding-box lookups against a campaign state.
+
+The STRtree is built once over the base world and never rebuilt. A merged
+country covers exactly the base rows in its members, so a lookup finds the
+base rows that contain a point and maps them to their current owner
+through an integer array. Applying a merge, undo or load only rewrites the
+owner entries of the affected rows.
+
+Usage: python query.py POINTS OUT [--lon lon] [--lat lat] [--campaign FILE]
+
+POINTS and OUT are CSV or Parquet files; each output row is the input row
+plus a ``country`` column.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from campaign import Campaign, WorldState
+from world_data import SNAPSHOT_DIR, default_source, load_world
+
+# Points processed per vectorized query, which bounds temporary memory
+CHUNK_SIZE = 1_000_000
+
+# Column added to geocoded files
+COUNTRY_COLUMN = "country"
+
+
+class CountryIndex:
+    """Spatial index over the countries of a campaign state."""
+
+    def __init__(self, state):
+        self.base = state.base
+        self.tree = shapely.STRtree(state.base.geometry.values)
+        self.names = state.base["NAME"].to_numpy(dtype=object)
+        self.owners = self.names.copy()
+        # The owners start out as the base world, a state without merges
+        self.state = WorldState(state.base, state.positions, frozenset(), {}, unions=state.unions)
+        self.update(state)
+
+    def update(self, state):
+        """Move the index to ``state``; return the number of base rows reassigned."""
+        if state.base is not self.base:
+            raise ValueError("The index was built for a different base world.")
+        changed = self.state.changed_positions(state)
+        for position in changed:
+            self.owners[position] = self.names[position]
+        for name, country in state.merged.items():
+            for position in country.members & changed:
+                self.owners[position] = name
+        self.state = state
+        return len(changed)
+
+    def countries_at(self, lon, lat):
+        """Return the country at each ``(lon, lat)`` pair, or None over the sea.
+
+        ``lon`` and ``lat`` are array-likes of equal length; they are queried
+        in chunks of ``CHUNK_SIZE`` points.
+        """
+        lon = np.asarray(lon, dtype=float)
+        lat = np.asarray(lat, dtype=float)
+        result = np.full(len(lon), None, dtype=object)
+        for start in range(0, len(lon), CHUNK_SIZE):
+            points = shapely.points(lon[start:start + CHUNK_SIZE], lat[start:start + CHUNK_SIZE])
+            point_index, row_index = self.tree.query(points, predicate="intersects")
+            result[start + point_index] = self.owners[row_index]
+        return result
+
+    def country_at(self, lon, lat):
+        """Return the country at a single point, or None."""
+        return self.countries_at([lon], [lat])[0]
+
+    def countries_in_bbox(self, minx, miny, maxx, maxy):
+        """Return the sorted names of countries intersecting a lon/lat box."""
+        rows = self.tree.query(shapely.box(minx, miny, maxx, maxy), predicate="intersects")
+        return sorted(set(self.owners[rows]))
+
+
+def _read_chunks(path, chunksize):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def geocode_file(index, source, out, lon="lon", lat="lat", chunksize=CHUNK_SIZE):
+    """Stream ``source`` through ``index`` into ``out``; return the number of rows."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows = 0
+    writer = None
+    try:
+        for i, chunk in enumerate(_read_chunks(source, chunksize)):
+            chunk[COUNTRY_COLUMN] = index.countries_at(chunk[lon].to_numpy(), chunk[lat].to_numpy())
+            if out.endswith(".parquet"):
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    # A first chunk entirely at sea would type the column as null
+                    schema = table.schema.set(
+                        table.schema.get_field_index(COUNTRY_COLUMN), pa.field(COUNTRY_COLUMN, pa.string())
+                    )
+                    writer = pq.ParquetWriter(out, schema)
+                writer.write_table(table.cast(writer.schema))
+            else:
+                chunk.to_csv(out, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("points", help="CSV or Parquet file with coordinates")
+    parser.add_argument("out", help="CSV or Parquet file to write")
+    parser.add_argument("--lon", default="lon", help="longitude column")
+    parser.add_argument("--lat", default="lat", help="latitude column")
+    parser.add_argument("--campaign", help="campaign file whose final state is queried")
+    parser.add_argument("--source", help="GeoJSON path or URL (defaults to WORLD_DATA_SOURCE)")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR, help="snapshot cache directory")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE, help="rows per chunk")
+    args = parser.parse_args(argv)
+
+    world = load_world(args.source or default_source(), args.snapshot_dir)
+    campaign = Campaign.load(args.campaign, world) if args.campaign else Campaign(world)
+    start = time.perf_counter()
+    index = CountryIndex(campaign.state)
+    rows = geocode_file(index, args.points, args.out, args.lon, args.lat, args.chunksize)
+    seconds = time.perf_counter() - start
+    print(f"{rows} points geocoded into {os.path.basename(args.out)} in {seconds:.1f} s ({rows / max(seconds, 1e-9):,.0f} points/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
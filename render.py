@@ -0,0 +1,112 @@
+"""Map rendering helpers.
+
+The filtered world is serialized once as a single FeatureCollection. Each
+feature carries its fill color and highlight flag as properties, so one
+style function and one tooltip cover every country.
+"""
+import folium
+
+from lru import LRUCache
+
+# Fill color for the attacker/target countries
+HIGHLIGHT_COLOR = "red"
+
+# Default size budget for cached map HTML, in characters
+MAX_CACHE_SIZE = 64 * 1024 * 1024
+
+
+def style_country(feature):
+    """Style a country from its ``fill`` and ``highlight`` properties."""
+    properties = feature["properties"]
+    if properties["highlight"]:
+        # Remove border for countries about to be merged
+        return {"fillColor": HIGHLIGHT_COLOR, "color": "none", "weight": 0, "fillOpacity": 0.7}
+    return {"fillColor": properties["fill"], "color": "black", "weight": 1, "fillOpacity": 0.7}
+
+
+def feature_collection(world, fill, highlight=(), name_field="NAME"):
+    """Return ``world`` as a FeatureCollection dict with style properties.
+
+    ``fill`` holds one color per row of ``world``; countries whose name is in
+    ``highlight`` are flagged for the highlight style.
+    """
+    names = world[name_field].tolist()
+    highlight = set(highlight)
+    layer = world[[name_field, "geometry"]].assign(
+        fill=list(fill),
+        highlight=[name in highlight for name in names],
+    )
+    return layer.to_geo_dict(drop_id=True)
+
+
+def country_layer(world, fill, highlight=(), name_field="NAME"):
+    """Build one ``folium.GeoJson`` layer for all countries in ``world``."""
+    return folium.GeoJson(
+        feature_collection(world, fill, highlight, name_field),
+        style_function=style_country,
+        tooltip=folium.GeoJsonTooltip(fields=[name_field], labels=False),
+    )
+
+
+def map_html(m):
+    """Serialize a map to the HTML document ``folium_static`` would embed."""
+    return folium.Figure().add_child(m).render()
+
+
+def build_map(state, view, zoom, attacker=None, target=None, tile_url=None):
+    """Build world4.py's folium map of ``view`` in ``state``.
+
+    The attacker is drawn in red on top. With ``tile_url`` the countries are
+    vector tiles highlighted in the browser; otherwise they come from the
+    view's payload for ``zoom``, previewing the merge of a pending invasion.
+    """
+    # Imported here because topology and tiles import this module
+    from topology import highlighted, merge_countries, topojson_layer
+    from views import WORLD
+
+    m = folium.Map(location=view.center, zoom_start=2 if view.name == WORLD else 4, tiles="cartodb positron")
+    if view.name != WORLD:
+        bounds = view.bounds
+        m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
+
+    # Highlight selected country in red
+    if attacker:
+        folium.GeoJson(
+            view.frame[view.frame["NAME"] == attacker],
+            style_function=lambda x: {"fillColor": HIGHLIGHT_COLOR, "color": "black", "weight": 2, "fillOpacity": 0.9},
+            tooltip=attacker,
+        ).add_to(m)
+
+    if tile_url:
+        from tiles import vector_tile_layer
+
+        # The page only references the tile endpoint; the browser fetches
+        # the visible tiles, highlighted client-side
+        vector_tile_layer(tile_url, [attacker, target], state.version).add_to(m)
+        return m
+
+    # Selected and invaded countries are highlighted in red without borders,
+    # drawn from the view's payload for the zoom level the map opens at
+    topo = highlighted(view.payload(state, zoom), [attacker, target])
+
+    # Preview the merged country while an invasion is pending; the merge
+    # only rewrites arc references, so no geometry is emitted twice
+    if attacker and target:
+        topo = merge_countries(topo, attacker, target, f"{attacker}-{target}")
+    topojson_layer(topo).add_to(m)
+    return m
+
+
+class RenderCache(LRUCache):
+    """Thread-safe LRU cache of rendered map HTML, bounded by total size.
+
+    One instance is meant to be shared by every session of a Streamlit
+    server, so keys must fully describe the map content.
+    """
+
+    def __init__(self, max_size=MAX_CACHE_SIZE):
+        super().__init__(max_size)
+
+    def get_or_render(self, key, render):
+        """Return the cached HTML for ``key``, calling ``render()`` on a miss."""
+        return self.get_or_build(key, render)
@@ -0,0 +1,209 @@
+"""Run many automated invasion campaigns headlessly and in parallel.
+
+Usage: python simulate.py [--runs N] [--seed S] [--strategy random|weighted|greedy]
+                          [--powers N] [--workers N] [--out DIR] [--no-geometries]
+
+A campaign is simulated on the adjacency graph alone: every merge only
+moves integer row positions and graph edges, and no geometry is unioned
+until the final powers are written. Each run is seeded, so the same seed
+and strategy always produce the same campaign. Per run the output holds
+the per-step statistics, a campaign file that world4.py can load, and the
+final merged geometries.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import geopandas as gpd
+import pandas as pd
+import shapely
+
+from campaign import Merge, campaign_json
+from neighbors import load_adjacency
+from world_data import SNAPSHOT_DIR, default_source, load_world
+
+# Equal-area projection used to weigh countries by size
+AREA_CRS = "EPSG:6933"
+
+# Result of one simulated campaign; members maps each power to base row positions
+Simulation = namedtuple("Simulation", ["seed", "strategy", "events", "steps", "members"])
+
+# World data for this worker process, loaded once by _init_worker
+_worker = {}
+
+
+def _random(rng, active, adjacency, area):
+    attacker = rng.choice(active)
+    return attacker, rng.choice(sorted(adjacency[attacker]))
+
+
+def _weighted(rng, active, adjacency, area):
+    # Larger powers attack more often; targets are picked uniformly
+    attacker = rng.choices(active, weights=[area[name] for name in active])[0]
+    return attacker, rng.choice(sorted(adjacency[attacker]))
+
+
+def _greedy(rng, active, adjacency, area):
+    # The largest power absorbs its smallest neighbor; the seed breaks ties
+    attacker = max(active, key=lambda name: (area[name], rng.random()))
+    return attacker, min(sorted(adjacency[attacker]), key=lambda name: area[name])
+
+
+STRATEGIES = {"random": _random, "weighted": _weighted, "greedy": _greedy}
+
+
+def country_areas(world):
+    """Return ``{name: area in km²}`` measured in an equal-area projection."""
+    return dict(zip(world["NAME"], world.geometry.to_crs(AREA_CRS).area.to_numpy() / 1e6))
+
+
+def simulate(world, adjacency, seed, strategy="random", powers=1, areas=None):
+    """Run one campaign until ``powers`` countries remain or no merge is possible.
+
+    Attackers keep their name, so the merge log replays as a campaign over
+    the same base world. ``areas`` can be passed in to avoid reprojecting
+    the world on every run.
+    """
+    choose = STRATEGIES[strategy]
+    rng = random.Random(seed)
+    names = world["NAME"].tolist()
+    continent = dict(zip(names, world["CONTINENT"].tolist()))
+    area = dict(areas if areas is not None else country_areas(world))
+    total_area = sum(area.values())
+    graph = {name: set(neighbors) for name, neighbors in adjacency.items()}
+    members = {name: [position] for position, name in enumerate(names)}
+    active = sorted(name for name in names if graph.get(name))
+
+    events = []
+    steps = []
+    largest = max(area, key=area.get)
+    while len(members) > powers and active:
+        attacker, target = choose(rng, active, graph, area)
+
+        # Absorb the target: only integer lists and graph edges change
+        members[attacker].extend(members.pop(target))
+        area[attacker] += area.pop(target)
+        for neighbor in graph.pop(target):
+            graph[neighbor].discard(target)
+            if neighbor != attacker:
+                graph[neighbor].add(attacker)
+                graph[attacker].add(neighbor)
+        active.remove(target)
+        if not graph[attacker]:
+            active.remove(attacker)
+        if largest == target or area[attacker] > area[largest]:
+            largest = attacker
+
+        events.append(Merge(attacker, target, attacker, continent[attacker]))
+        steps.append({
+            "step": len(events),
+            "attacker": attacker,
+            "target": target,
+            "powers": len(members),
+            "largest": largest,
+            "largest_countries": len(members[largest]),
+            "largest_share": area[largest] / total_area,
+        })
+    return Simulation(seed, strategy, events, steps, members)
+
+
+def power_geometries(world, simulation):
+    """Return the final powers as a GeoDataFrame; the deferred unions happen here."""
+    geoms = world.geometry.values
+    names = list(simulation.members)
+    continents = dict(zip(world["NAME"], world["CONTINENT"]))
+    return gpd.GeoDataFrame({
+        "NAME": names,
+        "CONTINENT": [continents[name] for name in names],
+        "countries": [len(simulation.members[name]) for name in names],
+        "geometry": [
+            geoms[positions[0]] if len(positions) == 1 else shapely.union_all(geoms[positions])
+            for positions in simulation.members.values()
+        ],
+    }, crs=world.crs)
+
+
+def _init_worker(source, snapshot_dir):
+    world = load_world(source, snapshot_dir)
+    _worker["world"] = world
+    _worker["adjacency"] = load_adjacency(world, source, snapshot_dir)
+    _worker["areas"] = country_areas(world)
+
+
+def _run(task):
+    seed, strategy, powers, out, geometries = task
+    world = _worker["world"]
+    start = time.perf_counter()
+    simulation = simulate(world, _worker["adjacency"], seed, strategy, powers, _worker["areas"])
+    seconds = time.perf_counter() - start
+
+    prefix = os.path.join(out, "runs", f"{strategy}-{seed}")
+    pd.DataFrame(simulation.steps).to_csv(prefix + ".steps.csv", index=False)
+    with open(prefix + ".campaign.json", "w") as f:
+        f.write(campaign_json(simulation.events))
+    if geometries:
+        power_geometries(world, simulation).to_parquet(prefix + ".parquet")
+
+    last = simulation.steps[-1] if simulation.steps else {}
+    return {
+        "seed": seed,
+        "strategy": strategy,
+        "steps": len(simulation.events),
+        "powers": len(simulation.members),
+        "largest": last.get("largest"),
+        "largest_countries": last.get("largest_countries"),
+        "largest_share": last.get("largest_share"),
+        "seconds": seconds,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", help="GeoJSON path or URL (defaults to WORLD_DATA_SOURCE)")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR, help="snapshot cache directory")
+    parser.add_argument("--out", default="simulations", help="output directory")
+    parser.add_argument("--runs", type=int, default=100, help="number of campaigns")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first run; runs use consecutive seeds")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="random")
+    parser.add_argument("--powers", type=int, default=1, help="stop when this many countries remain")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--geometries", action=argparse.BooleanOptionalAction, default=True,
+                        help="write the final merged geometries of each run")
+    args = parser.parse_args(argv)
+
+    source = args.source or default_source()
+    start = time.perf_counter()
+    # Build the snapshot and adjacency cache here so workers only read them
+    load_adjacency(load_world(source, args.snapshot_dir), source, args.snapshot_dir)
+    os.makedirs(os.path.join(args.out, "runs"), exist_ok=True)
+
+    tasks = [(seed, args.strategy, args.powers, args.out, args.geometries)
+             for seed in range(args.seed, args.seed + args.runs)]
+    summary = []
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(source, args.snapshot_dir)) as pool:
+        futures = [pool.submit(_run, task) for task in tasks]
+        for future in as_completed(futures):
+            try:
+                summary.append(future.result())
+            except Exception as e:
+                failed += 1
+                print(f"Run failed: {e}", file=sys.stderr)
+
+    summary = pd.DataFrame(summary)
+    if not summary.empty:
+        summary = summary.sort_values("seed")
+        summary.to_csv(os.path.join(args.out, "summary.csv"), index=False)
+        print(summary[["steps", "powers", "largest_share", "seconds"]].describe().loc[["mean", "min", "max"]])
+        print(f"Most frequent winners:\n{summary['largest'].value_counts().head(5).to_string()}")
+    print(f"{len(summary)} runs in {time.perf_counter() - start:.1f} s, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
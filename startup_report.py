@@ -0,0 +1,97 @@
+"""Report the startup cost of the Streamlit apps.
+
+Usage: python startup_report.py [world.py world4.py ...] [--top N] [--rerun] [--json FILE]
+
+For each app, its module-level imports are run in a fresh interpreter
+under ``-X importtime`` and the time is summarized per top-level package,
+which is the cold-start cost a new Streamlit worker pays. With ``--rerun``
+the app itself is also run headlessly with Streamlit's test harness to
+time the first run and a plain rerun.
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Streamlit apps measured by default
+APPS = ["world.py", "world2.py", "world3.py", "world4.py"]
+
+
+def module_imports(path):
+    """Return the module-level import statements of a script as source lines."""
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def import_times(statements, cwd):
+    """Run ``statements`` under ``-X importtime``; return ``{package: seconds}`` and the total."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "\n".join(statements)],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented and already counted in their parent
+        if not cumulative.strip().isdigit() or name.startswith("  "):
+            continue
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(cumulative) / 1e6
+    return packages, sum(packages.values())
+
+
+def app_run_times(path):
+    """Return ``(first run, rerun)`` seconds for an app under Streamlit's test harness."""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.abspath(path), default_timeout=120)
+    start = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    app.run()
+    return first, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("apps", nargs="*", default=APPS)
+    parser.add_argument("--top", type=int, default=8, help="packages listed per app")
+    parser.add_argument("--rerun", action="store_true", help="also time a first run and a rerun of each app")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    base = os.path.dirname(os.path.abspath(__file__))
+    report = {}
+    for app in args.apps:
+        path = os.path.join(base, app)
+        try:
+            packages, total = import_times(module_imports(path), base)
+        except (OSError, SyntaxError, RuntimeError) as e:
+            print(f"{app}: failed ({e})", file=sys.stderr)
+            continue
+        entry = {"import_seconds": total, "packages": dict(sorted(packages.items(), key=lambda item: -item[1]))}
+        print(f"\n{app}: imports {total * 1000:.0f} ms")
+        for package, seconds in list(entry["packages"].items())[:args.top]:
+            print(f"  {package:<24} {seconds * 1000:>8.1f} ms")
+        if args.rerun:
+            entry["first_run_seconds"], entry["rerun_seconds"] = app_run_times(path)
+            print(f"  first run {entry['first_run_seconds'] * 1000:.0f} ms, rerun {entry['rerun_seconds'] * 1000:.0f} ms")
+        report[app] = entry
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
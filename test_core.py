@@ -0,0 +1,341 @@
+"""Tests for the TopoJSON encoder, campaign states and continent views.
+
+They run on a small synthetic world, so no data has to be downloaded: a
+4 x 3 grid of 10 degree squares on two continents, where one square has a
+hole filled by an enclave country.
+"""
+import json
+import os
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Polygon, box
+
+from campaign import Campaign
+from coloring import map_colors
+from lod import build_pyramid
+from neighbors import build_adjacency
+from query import CountryIndex
+from render import build_map, map_html
+from tiles import TileLayer
+from topology import OBJECT_NAME, _decode, merge_arcs, merge_countries, topology
+from unions import UnionCache
+from views import ViewIndex
+from world_data import custom_source, load_world, read_batches, read_meta, snapshot_paths
+
+HOLE = (13, 13, 17, 17)
+
+
+@pytest.fixture(scope="module")
+def world():
+    names, continents, geoms = [], [], []
+    for i in range(4):
+        for j in range(3):
+            cell = box(i * 10, j * 10, i * 10 + 10, j * 10 + 10)
+            if (i, j) == (1, 1):
+                cell = Polygon(cell.exterior.coords, [box(*HOLE).exterior.coords])
+            names.append(f"C{i}{j}")
+            continents.append("West" if i < 2 else "East")
+            geoms.append(cell)
+    names.append("Enclave")
+    continents.append("West")
+    geoms.append(box(*HOLE))
+    return gpd.GeoDataFrame({"NAME": names, "ADMIN": names, "CONTINENT": continents}, geometry=geoms, crs="EPSG:4326")
+
+
+@pytest.fixture
+def campaign(world):
+    adjacency = build_adjacency(world)
+    return Campaign(world, adjacency, build_pyramid(world), map_colors(adjacency))
+
+
+def to_shape(topo, geometry):
+    """Decode one TopoJSON geometry back into a shapely geometry."""
+    scale = np.asarray(topo["transform"]["scale"])
+    translate = np.asarray(topo["transform"]["translate"])
+    polygons = [geometry["arcs"]] if geometry["type"] == "Polygon" else geometry["arcs"]
+    shapes = []
+    for polygon in polygons:
+        rings = [np.concatenate([_decode(topo["arcs"], ref) for ref in ring]) * scale + translate for ring in polygon]
+        shapes.append(Polygon(rings[0], rings[1:]))
+    return shapely.union_all(shapes)
+
+
+def geometries(topo):
+    return {geometry["properties"]["NAME"]: geometry for geometry in topo["objects"][OBJECT_NAME]["geometries"]}
+
+
+def assert_same_shape(actual, expected):
+    assert shapely.symmetric_difference(actual, expected).area < 1e-3 * expected.area
+
+
+def test_topology_round_trip(world):
+    topo = topology(world, ["#fff"] * len(world))
+    decoded = geometries(topo)
+    assert list(decoded) == world["NAME"].tolist()
+    for name, geom in zip(world["NAME"], world.geometry.values):
+        assert_same_shape(to_shape(topo, decoded[name]), geom)
+
+
+def test_topology_stores_shared_borders_once(world):
+    topo = topology(world, ["#fff"] * len(world))
+    refs = [
+        ref if ref >= 0 else ~ref
+        for geometry in geometries(topo).values()
+        for polygon in ([geometry["arcs"]] if geometry["type"] == "Polygon" else geometry["arcs"])
+        for ring in polygon
+        for ref in ring
+    ]
+    # Every interior border is referenced by the two countries sharing it
+    assert len(set(refs)) < len(refs)
+    assert max(refs.count(arc) for arc in set(refs)) == 2
+
+
+def test_merge_arcs_matches_union(world):
+    topo = topology(world, ["#fff"] * len(world))
+    decoded = geometries(topo)
+    geoms = dict(zip(world["NAME"], world.geometry.values))
+    for name, neighbors in build_adjacency(world, "touches").items():
+        for neighbor in neighbors:
+            merged = merge_arcs(topo, [decoded[name], decoded[neighbor]])
+            assert_same_shape(to_shape(topo, merged), shapely.union(geoms[name], geoms[neighbor]))
+
+
+def test_merge_fills_enclave_hole(world):
+    topo = topology(world, ["#fff"] * len(world))
+    merged = geometries(merge_countries(topo, "C11", "Enclave", "Merged"))
+    assert "C11" not in merged and "Enclave" not in merged
+    assert merged["Merged"]["type"] == "Polygon" and len(merged["Merged"]["arcs"]) == 1
+    assert_same_shape(to_shape(topo, merged["Merged"]), box(10, 10, 20, 20))
+
+
+def test_campaign_merge_undo_redo(campaign):
+    campaign.merge("C00", "C01", "West Union")
+    campaign.merge("West Union", "C10", "Greater West")
+    state = campaign.state
+    assert "Greater West" in state and "C00" not in state and "West Union" not in state
+    assert state.members("Greater West") == frozenset({0, 1, 3})
+    assert state.adjacency["Greater West"] >= {"C02", "C11", "C20"}
+    assert_same_shape(state.country("Greater West")[1], shapely.union_all([box(0, 0, 10, 20), box(10, 0, 20, 10)]))
+    assert len(state.frame()) == len(campaign.base) - 2
+
+    campaign.undo()
+    assert "West Union" in campaign.state and "Greater West" not in campaign.state
+    campaign.redo()
+    assert campaign.version == state.version
+
+    # A new merge after an undo discards the undone event
+    campaign.undo()
+    campaign.merge("West Union", "C02", "North West")
+    assert not campaign.can_redo
+    assert [event.name for event in campaign.events] == ["West Union", "North West"]
+
+
+def test_campaign_rejects_invalid_merges(campaign):
+    with pytest.raises(ValueError):
+        campaign.merge("C00", "C00", "Self")
+    with pytest.raises(ValueError):
+        campaign.merge("C00", "Atlantis", "Nowhere")
+    with pytest.raises(ValueError):
+        campaign.merge("C00", "C01", "C20")
+    assert not campaign.events
+
+
+def test_campaign_replay(campaign):
+    campaign.merge("C00", "C01", "A")
+    campaign.merge("C20", "C21", "B")
+    campaign.merge("A", "C10", "C")
+    campaign.undo()
+    replayed = campaign.replay(campaign.to_json())
+    assert replayed.position == 2 and len(replayed.events) == 3
+    assert replayed.version == campaign.version
+    assert sorted(replayed.state.frame()["NAME"]) == sorted(campaign.state.frame()["NAME"])
+    replayed.redo()
+    campaign.redo()
+    assert replayed.version == campaign.version
+
+
+def assert_same_views(index, fresh):
+    assert index.continents == fresh.continents
+    for name in fresh.continents:
+        assert index[name].names == fresh[name].names
+        assert sorted(index[name].frame["NAME"]) == sorted(fresh[name].frame["NAME"])
+        assert np.allclose(index[name].bounds, fresh[name].bounds)
+
+
+def test_view_index_update_matches_fresh_build(campaign):
+    index = ViewIndex(campaign.state)
+    steps = [
+        ("merge", "C00", "C01", "A"),
+        ("merge", "A", "C10", "B"),
+        ("undo",),
+        ("merge", "C20", "C30", "C"),
+        # Across continents: every East country ends up in West
+        ("merge", "C11", "C21", "D"),
+        ("merge", "D", "C31", "E"),
+        ("merge", "E", "C22", "F"),
+        ("merge", "F", "C32", "G"),
+        ("merge", "G", "C", "H"),
+        ("undo",),
+        ("redo",),
+    ]
+    for step in steps:
+        if step[0] == "merge":
+            campaign.merge(*step[1:])
+        else:
+            getattr(campaign, step[0])()
+        index = index.update(campaign.state)
+        assert_same_views(index, ViewIndex(campaign.state))
+        assert index.update(campaign.state) is index
+    assert "East" not in index.continents
+
+
+def test_view_index_update_switches_base_world(campaign, world):
+    index = ViewIndex(campaign.state)
+    other = Campaign(world[world["CONTINENT"] == "East"].reset_index(drop=True))
+    # Both fresh campaigns are at the same version, but not the same world
+    assert other.version == campaign.version
+    updated = index.update(other.state)
+    assert updated is not index
+    assert_same_views(updated, ViewIndex(other.state))
+
+
+def test_static_render_leaves_payload_unchanged(campaign):
+    view = ViewIndex(campaign.state)["West"]
+    payload = view.payload(campaign.state, 4)
+    before = json.dumps(payload, sort_keys=True)
+    map_html(build_map(campaign.state, view, 4, "C00", "C01"))
+    map_html(build_map(campaign.state, view, 4))
+    assert view.payload(campaign.state, 4) is payload
+    assert json.dumps(payload, sort_keys=True) == before
+
+
+def test_union_cache_reuses_and_evicts_sub_unions(world):
+    geoms = world.geometry.values
+    pairs = [frozenset({0, 1}), frozenset({6, 7}), frozenset({9, 10})]
+    sizes = [shapely.get_num_coordinates(shapely.union_all(geoms[sorted(pair)])) for pair in pairs]
+    cache = UnionCache(world, max_coords=sizes[0] + sizes[1])
+
+    pair = cache.submit(pairs[0])
+    pair.result()
+    # A larger union starts from the cached pair instead of its countries
+    pieces = cache._pieces(pairs[0] | {3})
+    assert pieces[0] is pair and len(pieces) == 2
+    assert_same_shape(cache.get(pairs[0] | {3}), shapely.union_all(geoms[[0, 1, 3]]))
+    assert cache.coords <= cache.max_coords
+
+    cache = UnionCache(world, max_coords=sizes[0] + sizes[1])
+    cache.get(pairs[0])
+    cache.get(pairs[1])
+    assert len(cache) == 2 and cache.coords == sizes[0] + sizes[1]
+    cache.get(pairs[0])
+    # Over budget, the least recently used union goes
+    cache.get(pairs[2])
+    assert len(cache) == 2 and cache.coords == sizes[0] + sizes[2]
+    hits, misses = cache.hits, cache.misses
+    cache.get(pairs[0])
+    cache.get(pairs[1])
+    assert (cache.hits, cache.misses) == (hits + 1, misses + 1)
+
+
+def test_country_index_update_matches_fresh_build(campaign, world):
+    index = CountryIndex(campaign.state)
+    assert index.country_at(5, 5) == "C00" and index.country_at(15, 15) == "Enclave"
+    assert index.country_at(-5, 5) is None
+
+    campaign.merge("C00", "C01", "A")
+    assert index.update(campaign.state) == 2
+    campaign.merge("C11", "Enclave", "B")
+    campaign.merge("A", "B", "C")
+    assert index.update(campaign.state) == 4
+    assert list(index.owners) == list(CountryIndex(campaign.state).owners)
+    assert index.countries_at([5, 15, 35], [15, 15, 5]).tolist() == ["C", "C", "C30"]
+    assert index.countries_in_bbox(0, 0, 12, 12) == ["C", "C10"]
+
+    # Undoing restores the rows of the undone merge only
+    campaign.undo()
+    assert index.update(campaign.state) == 4
+    assert list(index.owners) == list(CountryIndex(campaign.state).owners)
+    assert index.country_at(15, 15) == "B"
+    assert index.update(campaign.state) == 0
+
+    with pytest.raises(ValueError):
+        index.update(Campaign(world.copy()).state)
+
+
+def test_tile_layer_update_drops_changed_tiles(campaign, world):
+    layer = TileLayer(campaign.state)
+    keys = [(4, 8, 7), (4, 9, 7), (5, 16, 15), (5, 19, 15), (4, 0, 0)]
+    for key in keys:
+        layer.tile(*key)
+    assert len(layer) == len(keys)
+
+    # Only the tiles over the two merged countries are cut again
+    campaign.merge("C30", "C31", "East Union")
+    assert layer.update(campaign.state) == 2
+    assert set(layer.keys()) == {(4, 8, 7), (5, 16, 15), (4, 0, 0)}
+    fresh = TileLayer(campaign.state)
+    for key in keys:
+        assert layer.tile(*key) == fresh.tile(*key)
+    assert layer.update(campaign.state) == 0
+
+    # Another base world shares no tiles
+    assert layer.update(Campaign(world.copy()).state) == len(keys)
+    assert len(layer) == 0
+
+
+def test_snapshot_is_reused_until_the_source_changes(world, tmp_path, monkeypatch):
+    snapshot_dir = str(tmp_path / "snapshots")
+    source = str(tmp_path / "world.geojson")
+    world.to_file(source, driver="GeoJSON")
+    assert load_world(source, snapshot_dir)["NAME"].tolist() == world["NAME"].tolist()
+    assert read_meta(source, snapshot_dir)["rows"] == len(world)
+
+    # A fresh snapshot is read back without touching the source
+    monkeypatch.setattr("world_data.build_snapshot", lambda *args: pytest.fail("snapshot rebuilt"))
+    assert len(load_world(source, snapshot_dir)) == len(world)
+    monkeypatch.undo()
+
+    # Editing the source makes it stale
+    world[world["CONTINENT"] == "West"].to_file(source, driver="GeoJSON")
+    assert len(load_world(source, snapshot_dir)) == 7
+    assert read_meta(source, snapshot_dir)["rows"] == 7
+
+    # A file of the same name elsewhere gets its own snapshot
+    (tmp_path / "other").mkdir()
+    other = str(tmp_path / "other" / "world.geojson")
+    world.to_file(other, driver="GeoJSON")
+    assert snapshot_paths(other, snapshot_dir) != snapshot_paths(source, snapshot_dir)
+    assert len(load_world(other, snapshot_dir)) == len(world)
+    assert len(load_world(source, snapshot_dir)) == 7
+
+
+def test_sources_need_one_feature_per_name(world, tmp_path):
+    snapshot_dir = str(tmp_path / "snapshots")
+    source = str(tmp_path / "world.geojson")
+    repeated = world.copy()
+    repeated.loc[len(world) - 1, "NAME"] = "C00"
+    repeated.to_file(source, driver="GeoJSON")
+    with pytest.raises(ValueError, match="several features named C00"):
+        load_world(source, snapshot_dir)
+    assert read_meta(source, snapshot_dir) is None
+    assert not os.listdir(snapshot_dir)
+    # Repeats are found across batches too
+    with pytest.raises(ValueError, match="several features named C00"):
+        list(read_batches(source, batch_size=2))
+
+    unnamed = world.copy()
+    unnamed.loc[3, "NAME"] = None
+    unnamed.to_file(source, driver="GeoJSON")
+    with pytest.raises(ValueError, match="without a NAME"):
+        load_world(source, snapshot_dir)
+
+
+def test_custom_sources_stay_in_their_directory(tmp_path):
+    (tmp_path / "world.geojson").write_text("{}")
+    assert custom_source("world.geojson", str(tmp_path)) == os.path.realpath(tmp_path / "world.geojson")
+    for path in ["https://example.com/world.geojson", "missing.geojson", "../world.geojson", "/etc/hosts"]:
+        with pytest.raises(ValueError):
+            custom_source(path, str(tmp_path))
@@ -0,0 +1,225 @@
+"""Mapbox Vector Tiles for the country layer.
+
+Instead of embedding every geometry in the page, the map loads tiles from a
+small local HTTP endpoint, so the browser only fetches what is visible and
+the page weight no longer grows with the dataset. Tiles are cut on demand
+from the zoom level's pyramid geometry and cached; when the campaign moves
+to a new state only the tiles covering changed countries are dropped.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import uuid
+import weakref
+
+import mapbox_vector_tile
+import numpy as np
+import shapely
+from folium.plugins import VectorGridProtobuf
+from mapbox_vector_tile.encoder import on_invalid_geometry_make_valid
+
+from coloring import colors_for
+from endpoint import Endpoint, Handler
+from lod import at_zoom, level_for_zoom
+from lru import LRUCache
+from render import style_country
+
+# Address the tile endpoint listens on
+TILE_HOST = os.environ.get("WORLD_TILE_HOST", "127.0.0.1")
+TILE_PORT = int(os.environ.get("WORLD_TILE_PORT", "0"))
+
+# Base URL browsers fetch tiles from; defaults to the listening address,
+# which only a browser on the server itself can reach
+TILE_URL = os.environ.get("WORLD_TILE_URL")
+
+# Layer name inside each tile
+LAYER_NAME = "countries"
+
+# Tile grid resolution and the margin kept around each tile, in tile units
+EXTENT = 4096
+BUFFER = 64
+
+# Deepest zoom cut from the data; the client overzooms beyond it
+MAX_ZOOM = 10
+
+# Default size budget for cached tiles per layer, in bytes
+TILE_CACHE_SIZE = 32 * 1024 * 1024
+
+EARTH_RADIUS = 6378137.0
+MAX_LATITUDE = 85.0511287798
+
+_TILE_PATH = re.compile(r"^/(\w+)/(\d+)/(\d+)/(\d+)\.pbf$")
+
+
+def _to_mercator(coords):
+    lon = np.radians(coords[:, 0])
+    lat = np.radians(np.clip(coords[:, 1], -MAX_LATITUDE, MAX_LATITUDE))
+    return np.column_stack([lon * EARTH_RADIUS, np.log(np.tan(np.pi / 4 + lat / 2)) * EARTH_RADIUS])
+
+
+def tile_bounds(z, x, y):
+    """Return the Web Mercator bounds ``(minx, miny, maxx, maxy)`` of a tile."""
+    size = 2 * math.pi * EARTH_RADIUS / 2 ** z
+    origin = math.pi * EARTH_RADIUS
+    return (-origin + x * size, origin - (y + 1) * size, -origin + (x + 1) * size, origin - y * size)
+
+
+def _padded(bounds):
+    pad = (bounds[2] - bounds[0]) * BUFFER / EXTENT
+    return (bounds[0] - pad, bounds[1] - pad, bounds[2] + pad, bounds[3] + pad)
+
+
+def _changed_geometries(old, new):
+    """Return the base geometries covered by countries that differ between two states.
+
+    Merged countries are represented by their base members, so no union is
+    needed to find the tiles they touch.
+    """
+    if old.base is not new.base:
+        return None
+    return list(old.base.geometry.values[sorted(old.changed_positions(new))])
+
+
+class TileLayer(LRUCache):
+    """Vector tiles of one campaign's current state, cached per tile.
+
+    ``update`` switches to another state of the same base world and drops
+    only the cached tiles that intersect a country added or removed by the
+    switch; every other tile is served from the cache unchanged.
+    """
+
+    def __init__(self, state, max_size=TILE_CACHE_SIZE):
+        super().__init__(max_size)
+        self.state = state
+        self._levels = {}
+        self._generation = 0
+
+    def update(self, state):
+        """Switch to ``state``; return the number of cached tiles dropped."""
+        with self._lock:
+            if state.version == self.state.version and state.base is self.state.base:
+                return 0
+            changed = _changed_geometries(self.state, state)
+            self.state = state
+            self._levels = {}
+            self._generation += 1
+            if changed is None:
+                return self.clear()
+            return self._invalidate(changed)
+
+    def _invalidate(self, geometries):
+        keys = self.keys()
+        if not keys or not geometries:
+            return 0
+        tree = shapely.STRtree(shapely.transform(np.asarray(geometries, dtype=object), _to_mercator))
+        boxes = shapely.box(*np.array([_padded(tile_bounds(*key)) for key in keys]).T)
+        return self.discard({keys[i] for i in tree.query(boxes, predicate="intersects")[0]})
+
+    def _level(self, z):
+        """Return the Mercator geometries, index and properties drawn at zoom ``z``."""
+        level = level_for_zoom(z)
+        data = self._levels.get(level)
+        if data is None:
+            frame = self.state.frame()
+            names = frame["NAME"].tolist()
+            fills = colors_for(names, self.state.coloring)
+            geoms = shapely.transform(at_zoom(frame, self.state.pyramid, z).geometry.values, _to_mercator)
+            data = self._levels[level] = (geoms, shapely.STRtree(geoms), names, fills)
+        return data
+
+    def _render(self, geoms, tree, names, fills, z, x, y):
+        bounds = tile_bounds(z, x, y)
+        clip = _padded(bounds)
+        hits = np.sort(tree.query(shapely.box(*clip), predicate="intersects"))
+        clipped = shapely.clip_by_rect(geoms[hits], *clip)
+        features = [
+            {"geometry": geom, "properties": {"NAME": names[i], "fill": fills[i]}}
+            for i, geom in zip(hits, clipped)
+            if not geom.is_empty
+        ]
+        return mapbox_vector_tile.encode(
+            [{"name": LAYER_NAME, "features": features}],
+            default_options={"quantize_bounds": bounds, "extents": EXTENT, "on_invalid_geometry": on_invalid_geometry_make_valid},
+        )
+
+    def tile(self, z, x, y):
+        """Return ``(etag, data)`` for a tile, encoding it on a cache miss."""
+        key = (z, x, y)
+        with self._lock:
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            generation = self._generation
+            level = self._level(z)
+        # Encode outside the lock so other tiles are not blocked
+        data = self._render(*level, z, x, y)
+        cached = (hashlib.sha1(data).hexdigest()[:16], data)
+        with self._lock:
+            # A tile cut from a state that was replaced meanwhile is not kept
+            if generation == self._generation:
+                self.put(key, cached, len(data))
+        return cached
+
+
+class _TileHandler(Handler):
+    # Browsers revalidate every tile, so unchanged tiles cost a 304
+    cache_control = "no-cache"
+
+    def do_GET(self):
+        match = _TILE_PATH.match(self.path.split("?")[0])
+        layer = self.server.layers.get(match.group(1)) if match else None
+        z, x, y = (int(value) for value in match.groups()[1:]) if match else (0, 0, 0)
+        if layer is None or z > MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            self.send_error(404)
+            return
+        try:
+            etag, data = layer.tile(z, x, y)
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+        self.send_body(etag, data, "application/x-protobuf")
+
+
+class TileServer(Endpoint):
+    """Serve registered tile layers over HTTP from a background thread.
+
+    Layers are held weakly, so a layer stops being served once the session
+    that owns it is gone. ``public_url`` is the base URL browsers use to
+    reach the server, when it differs from the address it listens on.
+    """
+
+    def __init__(self, host=TILE_HOST, port=TILE_PORT, public_url=TILE_URL):
+        super().__init__(_TileHandler, host, port, public_url, layers=weakref.WeakValueDictionary())
+
+    def register(self, layer):
+        """Serve ``layer`` and return its tile URL template."""
+        key = uuid.uuid4().hex
+        self._httpd.layers[key] = layer
+        return f"{self.base_url}/{key}/{{z}}/{{x}}/{{y}}.pbf"
+
+
+def vector_tile_layer(url, highlight=(), version=None):
+    """Build a VectorGrid layer styled like ``render.style_country``.
+
+    Highlighting is applied in the browser, so changing the selection does
+    not invalidate any tile. ``version`` only changes the page when the
+    campaign state changes, which makes the map reload its tiles.
+    """
+    base = {**style_country({"properties": {"highlight": False, "fill": None}}), "fill": True}
+    base.pop("fillColor")
+    highlighted = {**style_country({"properties": {"highlight": True}}), "fill": True}
+    options = f"""{{
+        "maxNativeZoom": {MAX_ZOOM},
+        "campaignVersion": {json.dumps(version)},
+        "vectorTileLayerStyles": {{
+            "{LAYER_NAME}": function(properties) {{
+                if ({json.dumps(sorted(name for name in highlight if name))}.indexOf(properties.NAME) >= 0) {{
+                    return {json.dumps(highlighted)};
+                }}
+                return Object.assign({{"fillColor": properties.fill}}, {json.dumps(base)});
+            }}
+        }}
+    }}"""
+    return VectorGridProtobuf(url, LAYER_NAME, options, control=False)
@@ -0,0 +1,262 @@
+"""TopoJSON encoding of the country layer.
+
+Coordinates are quantized onto an integer grid, rings are cut into arcs at
+the junctions where borders meet, and each shared border is stored once
+and referenced by both countries. Arcs are delta-encoded, which keeps the
+numbers short in the serialized JSON.
+
+Merging two countries only rewrites arc references. The arcs the two
+countries share are dropped and the rest are stitched back into rings, so
+no geometry is re-emitted.
+"""
+import folium
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+from render import style_country
+
+# Grid size per axis; 1e5 keeps about 400 m precision on a world extent
+QUANTIZATION = 100_000
+
+# Name of the countries object inside the topology
+OBJECT_NAME = "countries"
+
+
+def _polygons(geom):
+    if geom is None or geom.is_empty:
+        return []
+    if geom.geom_type == "Polygon":
+        return [geom]
+    return [part for part in getattr(geom, "geoms", []) if part.geom_type == "Polygon"]
+
+
+def _quantized_ring(coords, translate, k):
+    points = np.rint((np.asarray(coords)[:, :2] - translate) * k).astype(np.int64)
+    # Drop vertices that collapsed onto their predecessor
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+    points = points[keep]
+    if len(points) < 4:
+        return None
+    return [tuple(point) for point in points[:-1].tolist()]
+
+
+def _junctions(rings):
+    """Return points where borders meet: those seen with different neighbors."""
+    first_neighbors = {}
+    junctions = set()
+    for ring in rings:
+        count = len(ring)
+        for i, point in enumerate(ring):
+            neighbors = frozenset((ring[i - 1], ring[(i + 1) % count]))
+            seen = first_neighbors.setdefault(point, neighbors)
+            if seen != neighbors:
+                junctions.add(point)
+    return junctions
+
+
+def _cut(ring, junctions):
+    """Split an open ring into closed-chain arcs that start and end at junctions."""
+    cuts = [i for i, point in enumerate(ring) if point in junctions]
+    if not cuts:
+        # Ring shares no junction: start at its smallest point so a ring
+        # used by two countries is cut identically both times
+        start = ring.index(min(ring))
+        ring = ring[start:] + ring[:start]
+        return [ring + [ring[0]]]
+    ring = ring[cuts[0]:] + ring[:cuts[0]]
+    cuts = [i - cuts[0] for i in cuts] + [len(ring)]
+    ring = ring + [ring[0]]
+    return [ring[start:end + 1] for start, end in zip(cuts, cuts[1:])]
+
+
+def _delta(arc):
+    encoded = [list(arc[0])]
+    for (x0, y0), (x1, y1) in zip(arc, arc[1:]):
+        encoded.append([x1 - x0, y1 - y0])
+    return encoded
+
+
+def _decode(arcs, ref):
+    arc = np.cumsum(np.asarray(arcs[ref if ref >= 0 else ~ref]), axis=0)
+    return arc if ref >= 0 else arc[::-1]
+
+
+def _geometry(polygons):
+    polygons = [polygon for polygon in polygons if polygon]
+    if not polygons:
+        return {"type": None}
+    if len(polygons) == 1:
+        return {"type": "Polygon", "arcs": polygons[0]}
+    return {"type": "MultiPolygon", "arcs": polygons}
+
+
+def topology(world, fill, highlight=(), name_field="NAME", quantization=QUANTIZATION):
+    """Encode ``world`` as a TopoJSON dict with the same properties as the GeoJSON layer."""
+    geoms = shapely.orient_polygons(world.geometry.values)
+    minx, miny, maxx, maxy = world.total_bounds
+    translate = np.array([minx, miny])
+    k = (quantization - 1) / np.maximum([maxx - minx, maxy - miny], 1e-12)
+
+    # Quantize every ring first so shared vertices compare equal
+    shapes = []
+    rings = []
+    for geom in geoms:
+        shape = []
+        for polygon in _polygons(geom):
+            polygon_rings = []
+            for ring in (polygon.exterior, *polygon.interiors):
+                points = _quantized_ring(ring.coords, translate, k)
+                if points is not None:
+                    polygon_rings.append(points)
+                    rings.append(points)
+            shape.append(polygon_rings)
+        shapes.append(shape)
+
+    junctions = _junctions(rings)
+    arcs = []
+    index = {}
+
+    def ref(arc):
+        key = tuple(arc)
+        if key in index:
+            return index[key]
+        reverse = tuple(reversed(arc))
+        if reverse in index:
+            return ~index[reverse]
+        index[key] = len(arcs)
+        arcs.append(arc)
+        return index[key]
+
+    highlight = set(highlight)
+    geometries = []
+    for name, color, shape in zip(world[name_field].tolist(), fill, shapes):
+        polygons = [
+            [[ref(arc) for arc in _cut(ring, junctions)] for ring in polygon_rings]
+            for polygon_rings in shape
+        ]
+        geometry = _geometry(polygons)
+        geometry["properties"] = {name_field: name, "fill": color, "highlight": name in highlight}
+        geometries.append(geometry)
+
+    return {
+        "type": "Topology",
+        "transform": {"scale": (1 / k).tolist(), "translate": translate.tolist()},
+        "objects": {OBJECT_NAME: {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": [_delta(arc) for arc in arcs],
+    }
+
+
+def _polygon_refs(geometry):
+    if geometry["type"] == "Polygon":
+        return [geometry["arcs"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["arcs"]
+    return []
+
+
+def merge_arcs(topo, geometries):
+    """Return a geometry covering ``geometries``, built from arc references only.
+
+    Arcs used by more than one of the input rings are interior borders and
+    are dropped; the remaining arcs are stitched into rings, and holes are
+    assigned to the smallest outer ring that contains them.
+    """
+    refs = [ref for geometry in geometries for polygon in _polygon_refs(geometry) for ring in polygon for ref in ring]
+    uses = {}
+    for ref in refs:
+        arc = ref if ref >= 0 else ~ref
+        uses[arc] = uses.get(arc, 0) + 1
+    boundary = [ref for ref in refs if uses[ref if ref >= 0 else ~ref] == 1]
+
+    arcs = topo["arcs"]
+    decoded = {ref: _decode(arcs, ref) for ref in boundary}
+    starts = {}
+    for ref in boundary:
+        starts.setdefault(tuple(decoded[ref][0]), []).append(ref)
+
+    rings = []
+    remaining = set(boundary)
+    for first in boundary:
+        if first not in remaining:
+            continue
+        ring = []
+        ref = first
+        while ref is not None:
+            remaining.discard(ref)
+            ring.append(ref)
+            end = tuple(decoded[ref][-1])
+            ref = next((candidate for candidate in starts.get(end, []) if candidate in remaining), None)
+        rings.append(ring)
+
+    outers = []
+    holes = []
+    for ring in rings:
+        coords = np.concatenate([decoded[ref] for ref in ring])
+        if len(coords) < 4:
+            continue
+        polygon = Polygon(coords)
+        # Rings are oriented counter-clockwise for shells, clockwise for holes
+        (outers if shapely.is_ccw(polygon.exterior) else holes).append((ring, polygon))
+
+    polygons = [[ring] for ring, _ in outers]
+    for ring, polygon in holes:
+        point = polygon.representative_point()
+        containing = [i for i, (_, outer) in enumerate(outers) if outer.contains(point)]
+        if containing:
+            polygons[min(containing, key=lambda i: outers[i][1].area)].append(ring)
+    return _geometry(polygons)
+
+
+def merge_countries(topo, attacker, target, new_name, name_field="NAME"):
+    """Return a topology with two countries replaced by their merged geometry.
+
+    The ``arcs`` list is shared with the input topology; only the object's
+    geometry list is rebuilt. The merged country keeps the attacker's
+    properties under ``new_name``.
+    """
+    collection = topo["objects"][OBJECT_NAME]
+    parts = [geometry for geometry in collection["geometries"] if geometry["properties"][name_field] in (attacker, target)]
+    if not parts:
+        return topo
+    merged = merge_arcs(topo, parts)
+    source = next((part for part in parts if part["properties"][name_field] == attacker), parts[0])
+    merged["properties"] = {**source["properties"], name_field: new_name}
+    geometries = [geometry for geometry in collection["geometries"] if geometry["properties"][name_field] not in (attacker, target)]
+    geometries.append(merged)
+    return {**topo, "objects": {**topo["objects"], OBJECT_NAME: {**collection, "geometries": geometries}}}
+
+
+def highlighted(topo, highlight, name_field="NAME"):
+    """Return a topology with the ``highlight`` flag set for the named countries.
+
+    Only the geometry dicts whose flag changes are copied, so a cached
+    topology can be highlighted without encoding it again.
+    """
+    highlight = set(highlight)
+    collection = topo["objects"][OBJECT_NAME]
+    geometries = []
+    for geometry in collection["geometries"]:
+        flag = geometry["properties"][name_field] in highlight
+        if geometry["properties"]["highlight"] != flag:
+            geometry = {**geometry, "properties": {**geometry["properties"], "highlight": flag}}
+        geometries.append(geometry)
+    return {**topo, "objects": {**topo["objects"], OBJECT_NAME: {**collection, "geometries": geometries}}}
+
+
+def topojson_layer(topo, name_field="NAME"):
+    """Build a ``folium.TopoJson`` layer styled like ``render.country_layer``.
+
+    folium writes a ``style`` entry into every geometry's properties, so it
+    gets its own copies; ``topo`` is often a payload cached by a view.
+    """
+    collection = topo["objects"][OBJECT_NAME]
+    geometries = [{**geometry, "properties": dict(geometry["properties"])} for geometry in collection["geometries"]]
+    topo = {**topo, "objects": {**topo["objects"], OBJECT_NAME: {**collection, "geometries": geometries}}}
+    return folium.TopoJson(
+        topo,
+        f"objects.{OBJECT_NAME}",
+        style_function=style_country,
+        tooltip=folium.GeoJsonTooltip(fields=[name_field], labels=False),
+    )
@@ -0,0 +1,100 @@
+"""Deferred, cached unions of base countries.
+
+A merged country is identified by the set of base row positions it covers,
+so its geometry can be computed whenever it is first needed and shared by
+every state, campaign or session that produces the same set. Unions are
+built from the largest cached sub-unions they contain, which keeps
+repeated merges from re-unioning ever larger pieces from scratch.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import shapely
+
+from lru import LRUCache
+
+# Default budget for cached unions, in vertices
+MAX_UNION_COORDS = 2_000_000
+
+
+def _resolved(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class UnionCache:
+    """Thread-safe LRU cache of unions keyed by frozensets of base row positions.
+
+    Unions run on a background thread pool (GEOS releases the GIL), so
+    ``submit`` returns immediately and ``get`` only waits when the result
+    is actually needed. Completed entries are evicted least recently used
+    once their total vertex count exceeds ``max_coords``.
+    """
+
+    def __init__(self, base, max_coords=MAX_UNION_COORDS, workers=2):
+        self.geoms = base.geometry.values
+        self.max_coords = max_coords
+        # Futures by members; each is sized in vertices once its union is done
+        self._entries = LRUCache(max_coords)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="union")
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def coords(self):
+        return self._entries.size
+
+    @property
+    def hits(self):
+        return self._entries.hits
+
+    @property
+    def misses(self):
+        return self._entries.misses
+
+    def _pieces(self, members):
+        """Split ``members`` into cached sub-unions, largest first, plus base geometries."""
+        remaining = set(members)
+        pieces = []
+        for key, future in sorted(self._entries.items(), key=lambda item: len(item[0]), reverse=True):
+            if len(key) > 1 and key <= remaining:
+                pieces.append(future)
+                self._entries.touch(key)
+                remaining -= key
+        pieces.extend(self.geoms[position] for position in sorted(remaining))
+        return pieces
+
+    def submit(self, members):
+        """Start the union of ``members`` if needed and return its future."""
+        members = frozenset(members)
+        if len(members) == 1:
+            return _resolved(self.geoms[next(iter(members))])
+        with self._lock:
+            future = self._entries.get(members)
+            if future is not None:
+                return future
+            # Pieces were submitted earlier, so the pool finishes them first
+            pieces = self._pieces(members)
+            future = self._executor.submit(self._union, members, pieces)
+            # Running unions have no size yet, so they are never evicted
+            self._entries.put(members, future)
+        return future
+
+    def get(self, members):
+        """Return the union of ``members``, waiting for it if it is still running."""
+        return self.submit(members).result()
+
+    def _union(self, members, pieces):
+        try:
+            geom = shapely.union_all([piece.result() if isinstance(piece, Future) else piece for piece in pieces])
+        except Exception:
+            with self._lock:
+                self._entries.discard([members])
+            raise
+        # Taking the lock waits for submit to have stored the future
+        with self._lock:
+            self._entries.resize(members, shapely.get_num_coordinates(geom))
+        return geom
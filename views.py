@@ -0,0 +1,92 @@
+"""Per-continent views of a world state, built once per state version.
+
+A view holds everything the apps derive from a continent filter: the
+rows, their bounds and center, the sorted country names and the TopoJSON
+payload per level of detail. Switching continents is a dictionary lookup.
+When the state changes, only the continents touched by the change are
+rebuilt; every other view object is carried over as is, payloads included,
+because a merge does not change any other country's geometry or color.
+"""
+from collections import namedtuple
+
+from coloring import colors_for
+from lod import at_zoom, level_for_zoom, zoom_for_bounds
+from topology import topology
+
+# Name of the view covering every country
+WORLD = "World"
+
+_View = namedtuple("_View", ["name", "frame", "bounds", "center", "names", "payloads"])
+
+
+class View(_View):
+    """Countries of one continent (or the world) in a fixed state."""
+
+    def zoom(self, width, height):
+        """Return the zoom ``fit_bounds`` picks for this view in a map of this size."""
+        return 2 if self.name == WORLD else zoom_for_bounds(self.bounds, width, height)
+
+    def payload(self, state, zoom):
+        """Return the TopoJSON dict for this view at ``zoom``, encoded once per level."""
+        level = level_for_zoom(zoom)
+        if level not in self.payloads:
+            colors = colors_for(self.frame["NAME"], state.coloring)
+            self.payloads[level] = topology(at_zoom(self.frame, state.pyramid, zoom), colors)
+        return self.payloads[level]
+
+
+def _view(name, frame):
+    bounds = frame.total_bounds
+    center = [0, 0] if name == WORLD else [(bounds[1] + bounds[3]) / 2, (bounds[0] + bounds[2]) / 2]
+    return View(name, frame, bounds, center, sorted(frame["NAME"].dropna().unique()), {})
+
+
+def _changed_continents(old, new):
+    """Return the continents with a country that differs between two states."""
+    continents = {country.continent for name, country in old.merged.items() if new.merged.get(name) is not country}
+    continents.update(country.continent for name, country in new.merged.items() if old.merged.get(name) is not country)
+    base_continents = old.base["CONTINENT"].to_numpy()
+    continents.update(base_continents[sorted(old.changed_positions(new))])
+    return continents
+
+
+class ViewIndex:
+    """Views of every continent of one state, keyed by continent name."""
+
+    def __init__(self, state, views=None):
+        self.version = state.version
+        self.state = state
+        self.views = views if views is not None else self._build(state, None)
+
+    @staticmethod
+    def _build(state, continents):
+        frame = state.frame()
+        views = {WORLD: _view(WORLD, frame)}
+        groups = frame.groupby("CONTINENT", sort=True).indices
+        for continent, rows in groups.items():
+            if continents is None or continent in continents:
+                views[continent] = _view(continent, frame.iloc[rows])
+        return views
+
+    @property
+    def continents(self):
+        """Return ``["World", *continents]`` in display order."""
+        return [WORLD] + sorted(name for name in self.views if name != WORLD)
+
+    def __getitem__(self, name):
+        return self.views[name]
+
+    def update(self, state):
+        """Return the index for ``state``, rebuilding only the changed continents."""
+        # Every fresh campaign is at version "base", so a state over another
+        # base world must be told apart before the versions are compared
+        if state.base is not self.state.base:
+            return ViewIndex(state)
+        if state.version == self.version:
+            return self
+        changed = _changed_continents(self.state, state)
+        # Changed continents come only from the rebuild, so one whose last
+        # country was merged away disappears
+        views = {name: view for name, view in self.views.items() if name not in changed and name != WORLD}
+        views.update(self._build(state, changed))
+        return ViewIndex(state, views)
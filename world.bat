@@ -2,6 +2,6 @@
 cd c:\world
 python -m venv venv
 call venv\Scripts\activate
-pip install folium geopandas ipywidgets matplotlib
+pip install -r requirements.txt ipywidgets matplotlib
 python world.py
 deactivate
\ No newline at end of file
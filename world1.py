@@ -1,51 +1,32 @@
 import folium
-import geopandas as gpd
-import random
-import requests
 import signal
 import sys
-from io import BytesIO
+from world_data import load_world
+from topology import topojson_layer, topology
+from coloring import stable_choice
+from lod import at_zoom, load_pyramid
 
-# URL for the GeoJSON file
-geojson_url = "https://raw.githubusercontent.com/nvkelso/natural-earth-vector/master/geojson/ne_110m_admin_0_countries.geojson"
-
-# Download the GeoJSON data
+# Load the world data (local snapshot, downloaded on first run)
 try:
-    response = requests.get(geojson_url)
-    response.raise_for_status()  # Ensure request was successful
-    world = gpd.read_file(BytesIO(response.content))  # Load into GeoPandas from bytes
+    world = load_world()
 except Exception as e:
     print(f"Error loading GeoJSON: {e}")
     sys.exit(1)
 
-# Function to assign random color patterns
-def get_random_pattern():
-    patterns = ['solid', 'stripes', 'spots']
-    return random.choice(patterns)
+# Color for each pattern type
+PATTERN_COLORS = {'solid': 'blue', 'stripes': 'red', 'spots': 'green'}
 
-def create_pattern_map(country_name, pattern_type):
-    """Assign colors based on pattern type"""
-    colors = {'solid': 'blue', 'stripes': 'red', 'spots': 'green'}
-    return colors.get(pattern_type, 'gray')
+def create_pattern_map(country_names):
+    """Assign colors based on a pattern type picked per country, stable across runs"""
+    return stable_choice(country_names, list(PATTERN_COLORS.values()))
 
 # Create a folium world map
 m = folium.Map(location=[20, 0], zoom_start=2)
 
-# Add countries to map with hover tooltip
-for _, country in world.iterrows():
-    pattern = get_random_pattern()
-    color = create_pattern_map(country['ADMIN'], pattern)  # 'ADMIN' column holds country names
-
-    folium.GeoJson(
-        country['geometry'],
-        style_function=lambda x, color=color: {
-            'fillColor': color,
-            'color': 'black',
-            'weight': 1,
-            'fillOpacity': 0.7
-        },
-        tooltip=country['ADMIN']
-    ).add_to(m)
+# Add all countries to map as one TopoJSON layer with hover tooltip
+colors = create_pattern_map(world['ADMIN'])  # 'ADMIN' column holds country names
+topo = topology(at_zoom(world, load_pyramid(world), 2), colors, name_field='ADMIN')  # geometry simplified for zoom 2, shared borders stored once
+topojson_layer(topo, name_field='ADMIN').add_to(m)
 
 # Save and display the map
 m.save("world_map.html")
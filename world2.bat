@@ -2,6 +2,6 @@
 cd c:\world
 python -m venv venv
 call venv\Scripts\activate
-pip install geopandas ipywidgets matplotlib streamlit cartopy streamlit_folium
+pip install -r requirements.txt ipywidgets matplotlib cartopy
 streamlit run world2.py
 deactivate
\ No newline at end of file
@@ -1,37 +1,30 @@
-import random
-import matplotlib.pyplot as plt
-import geopandas as gpd
 import streamlit as st
-import numpy as np
 import os
 import folium
-from shapely.geometry import MultiPolygon
 from streamlit_folium import folium_static
-
-try:
-    import cartopy.crs as ccrs
-    CARTOPY_AVAILABLE = True
-except ImportError:
-    CARTOPY_AVAILABLE = False
-    st.warning("Cartopy is not installed. Some map features may not work correctly.")
+from world_data import load_world
+from topology import topojson_layer, topology
+from coloring import stable_colors
+from lod import at_zoom, load_pyramid, zoom_for_bounds
 
 # Set fullscreen mode if enabled
 st.set_page_config(layout="wide")
 
-# URL for GeoJSON world data
-geojson_url = "https://raw.githubusercontent.com/nvkelso/natural-earth-vector/master/geojson/ne_110m_admin_0_countries.geojson"
-
-@st.cache_data
+@st.cache_resource
 def load_data():
     try:
-        world = gpd.read_file(geojson_url)
-        world['CONTINENT'] = world['CONTINENT'].astype(str)
-        return world
+        return load_world()
     except Exception as e:
-        st.error(f"Error loading GeoJSON: {e}")
+        st.error(f"Error loading world data: {e}")
         return None
 
+@st.cache_resource
+def load_levels(_world):
+    """Load the simplified geometry pyramid for the base snapshot."""
+    return load_pyramid(_world)
+
 world = load_data()
+pyramid = load_levels(world) if world is not None else None
 
 if world is not None:
     # Sidebar options
@@ -39,6 +32,7 @@ if world is not None:
     st.sidebar.title("Select Continent")
     selected_continent = st.sidebar.selectbox("Choose a continent:", continents)
     fullscreen = st.sidebar.checkbox("Enable Full-Screen Mode", value=False)
+    width, height = (1600, 900) if fullscreen else (1200, 800)
 
     # Clear existing elements before displaying a new one
     map_container = st.empty()
@@ -47,6 +41,7 @@ if world is not None:
     if selected_continent == "World":
         filtered_world = world
         zoom_start = 2
+        zoom = zoom_start
         center = [0, 0]
     else:
         filtered_world = world[world['CONTINENT'] == selected_continent]
@@ -55,6 +50,7 @@ if world is not None:
         bounds = filtered_world.total_bounds
         center = [(bounds[1] + bounds[3]) / 2, (bounds[0] + bounds[2]) / 2]
         zoom_start = 4
+        zoom = zoom_for_bounds(bounds, width, height)  # zoom after fit_bounds
 
     # Initialize folium map
     m = folium.Map(location=center, zoom_start=zoom_start, tiles="cartodb positron")
@@ -62,21 +58,14 @@ if world is not None:
         bounds = filtered_world.total_bounds
         m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
 
-    def get_random_pattern():
-        return random.choice(['solid', 'stripes', 'spots'])
-
-    # Add only the selected continent’s countries
-    for _, country in filtered_world.iterrows():
-        color = f"#{random.randint(0, 255):02x}{random.randint(0, 255):02x}{random.randint(0, 255):02x}"
-        folium.GeoJson(
-            country['geometry'],
-            style_function=lambda x, col=color: {"fillColor": col, "color": "black", "weight": 1, "fillOpacity": 0.7},
-            tooltip=country['NAME']
-        ).add_to(m)
+    # Add only the selected continent’s countries as a single layer
+    colors = stable_colors(filtered_world['NAME'])  # same color for a country on every rerun
+    # Draw geometry simplified for the zoom level the map opens at
+    topojson_layer(topology(at_zoom(filtered_world, pyramid, zoom), colors)).add_to(m)
 
     # Render map in Streamlit container
     map_container.empty()
-    map_container = folium_static(m, width=1600 if fullscreen else 1200, height=900 if fullscreen else 800)
+    map_container = folium_static(m, width=width, height=height)
 
     # Ensure batch session closes properly
     st.sidebar.button("Exit App", on_click=lambda: os._exit(0))
@@ -1,135 +1,315 @@
-import random
-import geopandas as gpd
 import streamlit as st
-import folium
 import os
-import pandas as pd
-from shapely.ops import unary_union
-from streamlit_folium import folium_static
+import uuid
+import weakref
+from collections import deque
+from world_data import CUSTOM_DATA_DIR, RESOLUTIONS, custom_source, default_source, load_world, resolution_source
+from render import RenderCache, build_map, map_html
+from lod import level_for_zoom, load_pyramid
+from neighbors import load_adjacency, neighbors_of
+from campaign import Campaign, SharedCampaign
+from memory import deep_size, shared_ids, shared_size
+from unions import UnionCache
+from coloring import map_colors
+from views import ViewIndex
+from delivery import PayloadServer, PayloadStore, args_size, live_map, map_args, map_view, publish_view
+from instrument import NULL_TRACE, TRACE_LOG, Trace, frame_bytes, to_json_lines
 
 # Set fullscreen mode if enabled
 st.set_page_config(layout="wide")
 
-# URL for GeoJSON world data
-geojson_url = "https://raw.githubusercontent.com/nvkelso/natural-earth-vector/master/geojson/ne_110m_admin_0_countries.geojson"
+# Shared resources are keyed by data source, so every resolution is loaded
+# once per process and sessions on the same dataset share it read-only.
+# Each keeps the datasets in use: the resolutions, the default and a custom file
+MAX_DATASETS = len(RESOLUTIONS) + 2
 
-@st.cache_data
-def load_data():
-    """Load world map data."""
+@st.cache_resource(max_entries=MAX_DATASETS)
+def load_data(source):
+    """Load world map data once per process and source."""
+    return load_world(source)
+
+def base_data(source):
+    """Return the base world for ``source``, or None after reporting the error."""
     try:
-        world = gpd.read_file(geojson_url)
-        world['CONTINENT'] = world['CONTINENT'].astype(str)
-        return world
+        return load_data(source)
     except Exception as e:
-        st.error(f"Error loading GeoJSON: {e}")
+        st.error(f"Error loading world data: {e}")
         return None
 
-# Initialize world data in session state if not already loaded
-if "world_data" not in st.session_state:
-    st.session_state.world_data = load_data()
+@st.cache_resource(max_entries=MAX_DATASETS)
+def load_levels(source):
+    """Load the simplified geometry pyramid for the base snapshot."""
+    return load_pyramid(load_data(source), source)
+
+@st.cache_resource(max_entries=MAX_DATASETS)
+def load_neighbors(source):
+    """Load the country adjacency graph for the base snapshot."""
+    return load_adjacency(load_data(source), source)
+
+@st.cache_resource(max_entries=MAX_DATASETS)
+def load_colors(source):
+    """Color the base map so neighboring countries never share a color."""
+    return map_colors(load_neighbors(source))
+
+@st.cache_resource(max_entries=MAX_DATASETS)
+def load_unions(source):
+    """Merged-country unions shared by all sessions, keyed by base rows."""
+    return UnionCache(load_data(source))
+
+@st.cache_resource
+def map_cache():
+    """Rendered map HTML shared by all sessions on this server."""
+    return RenderCache()
+
+@st.cache_resource
+def tile_server():
+    """Local vector tile endpoint shared by all sessions on this server."""
+    from tiles import TileServer
+
+    return TileServer()
+
+@st.cache_resource
+def payload_server():
+    """Compressed map payload endpoint shared by all sessions on this server."""
+    return PayloadServer(PayloadStore())
+
+@st.cache_resource(max_entries=MAX_DATASETS)
+def shared_campaign(source):
+    """One campaign per dataset seen and edited by every session in shared mode."""
+    return new_campaign(source, SharedCampaign)
+
+@st.cache_resource
+def session_registry():
+    """Campaigns of live sessions, dropped as their sessions end."""
+    return weakref.WeakValueDictionary()
+
+@st.cache_resource(max_entries=MAX_DATASETS)
+def shared_memory(source):
+    """Ids of objects every session shares, excluded from per-session sizes."""
+    return shared_ids(load_data(source), load_neighbors(source), load_levels(source), load_colors(source), load_unions(source))
+
+def new_campaign(source, campaign_class=Campaign):
+    """Start a campaign over the shared base world, graph, pyramid, colors and unions."""
+    return campaign_class(load_data(source), load_neighbors(source), load_levels(source), load_colors(source), load_unions(source))
+
+# Dataset selection; "Default" is WORLD_DATA_SOURCE or the WORLD_RESOLUTION
+# file. Wide views draw simplified geometry whatever the resolution, so the
+# finer files mostly cost when zoomed in
+resolution = st.sidebar.selectbox("Dataset resolution:", ["Default", *RESOLUTIONS, "Custom file"])
+source = default_source()
+if resolution == "Custom file":
+    path = st.sidebar.text_input(f"GeoJSON, GeoPackage or shapefile in {CUSTOM_DATA_DIR}:").strip()
+    if path:
+        try:
+            source = custom_source(path)
+        except ValueError as e:
+            st.sidebar.error(f"{e}; using the default dataset.")
+elif resolution != "Default":
+    source = resolution_source(resolution)
+
+if "session_key" not in st.session_state:
+    st.session_state.session_key = uuid.uuid4().hex
+
+# Instrument this run when the debug panel is open or a trace log is set;
+# otherwise every span below is a no-op
+instrumented = st.session_state.get("debug_panel", False) or TRACE_LOG is not None
+trace = Trace(app="world4", session=st.session_state.session_key, source=source) if instrumented else NULL_TRACE
+
+def finish_trace():
+    """Finish this run's trace once and keep it for the debug panel."""
+    if trace.finished is None and trace.finish() is not None:
+        st.session_state.setdefault("traces", deque(maxlen=100)).append(trace.finished)
+    return trace.finished
+
+def rerun():
+    """Rerun the app, logging this run's trace first."""
+    finish_trace()
+    st.rerun()
 
-world = st.session_state.world_data  # Use session state data
+# Start a campaign when the session starts or switches datasets; it only
+# holds this session's merges on top of the shared base world
+if st.session_state.get("campaign_source") != source:
+    with trace.span("load"):
+        base_world = base_data(source)
+        st.session_state.campaign = new_campaign(source) if base_world is not None else None
+    st.session_state.campaign_source = source if base_world is not None else None
+
+shared = st.session_state.get("shared_campaign", False) and st.session_state.campaign is not None
+with trace.span("load"):
+    campaign = shared_campaign(source) if shared else st.session_state.campaign
+if campaign is not None:
+    session_registry()[st.session_state.session_key] = campaign
+    trace.watch("union_cache", load_unions(source))
+# Read the state once so this run draws one consistent version, even if
+# another session merges in shared mode meanwhile
+state = campaign.state if campaign is not None else None
+with trace.span("frame"):
+    world = state.frame() if state is not None else None  # Current world after all merges
 
 if world is not None:
+    # Per-continent views for this state version; only continents changed
+    # since the previous version are rebuilt
+    previous = st.session_state.get("view_index")
+    with trace.span("views"):
+        view_index = previous.update(state) if previous is not None else ViewIndex(state)
+    trace.count("view_index.hits" if view_index is previous else "view_index.misses")
+    st.session_state.view_index = view_index
+
     # Sidebar selection
-    continents = ["World"] + sorted(world['CONTINENT'].dropna().unique().tolist())
+    continents = view_index.continents
     st.sidebar.title("Select Continent")
     selected_continent = st.sidebar.selectbox("Choose a continent:", continents)
     fullscreen = st.sidebar.checkbox("Enable Full-Screen Mode", value=False)
+    # Live and vector tiles load from local endpoints, which remote browsers
+    # only reach when WORLD_PAYLOAD_URL / WORLD_TILE_URL point at them, so
+    # static HTML is the default
+    delivery = st.sidebar.radio(
+        "Map delivery:", ["Static HTML", "Live", "Vector tiles"],
+        help="Live sends the geometry once and only the highlight on later reruns",
+    )
+    vector_tiles = delivery == "Vector tiles"
+    width, height = (1600, 900) if fullscreen else (1200, 800)
 
     map_container = st.empty()
     
-    # Filter world data based on selected continent
-    if selected_continent == "World":
-        filtered_world = world.copy()
-        zoom_start = 2
-        center = [0, 0]
-    else:
-        filtered_world = world[world['CONTINENT'] == selected_continent].copy()
-        if filtered_world.empty:
-            st.error("No data available for the selected continent.")
-        bounds = filtered_world.total_bounds
-        center = [(bounds[1] + bounds[3]) / 2, (bounds[0] + bounds[2]) / 2]
-        zoom_start = 4
-
-    m = folium.Map(location=center, zoom_start=zoom_start, tiles="cartodb positron")
-    if selected_continent != "World":
-        bounds = filtered_world.total_bounds
-        m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
-
-    # Sort countries alphabetically
-    sorted_countries = sorted(filtered_world['NAME'].dropna().unique())
+    # Look up the selected continent's rows, bounds and sorted names
+    view = view_index[selected_continent]
+    filtered_world, sorted_countries = view.frame, view.names
+    zoom = view.zoom(width, height)  # zoom after fit_bounds
 
     selected_country = st.sidebar.selectbox("Select an attacking country:", [None] + sorted_countries)
     neighbors = []
-    merged_geometry = None
     
     if selected_country:
-        country_geom = filtered_world[filtered_world['NAME'] == selected_country].geometry.values[0]
-        neighbors = filtered_world[filtered_world.intersects(country_geom) & (filtered_world['NAME'] != selected_country)]['NAME'].tolist()
-    
-        # Highlight selected country in red
-        folium.GeoJson(
-            filtered_world[filtered_world['NAME'] == selected_country],
-            style_function=lambda x: {"fillColor": "red", "color": "black", "weight": 2, "fillOpacity": 0.9},
-            tooltip=selected_country
-        ).add_to(m)
+        with trace.span("neighbors"):
+            neighbors = neighbors_of(state.adjacency, selected_country, set(sorted_countries))
     
     invaded_country = None
     if selected_country and neighbors:
-        invaded_country = st.sidebar.selectbox("Choose a neighboring country to invade:", [None] + sorted(neighbors))
+        invaded_country = st.sidebar.selectbox("Choose a neighboring country to invade:", [None] + neighbors)
     
     if selected_country and invaded_country:
-        selected_country_geom = filtered_world[filtered_world['NAME'] == selected_country].geometry.values[0]
-        invaded_country_geom = filtered_world[filtered_world['NAME'] == invaded_country].geometry.values[0]
-        
-        # Merge the geometries of the selected and invaded country
-        merged_geometry = unary_union([selected_country_geom, invaded_country_geom])
-        
         # Create a name for the new country
         merged_name = selected_country + "-" + invaded_country
         new_name = st.sidebar.text_input("New country name:", merged_name)
         
         if new_name and st.sidebar.button("Confirm Invasion"):
-            # Remove the invaded and selected countries
-            st.session_state.world_data = st.session_state.world_data[~st.session_state.world_data['NAME'].isin([selected_country, invaded_country])]
-            
-            # Add the merged country with the new name
-            new_row = gpd.GeoDataFrame({"NAME": [new_name], "geometry": [merged_geometry], "CONTINENT": [selected_continent]})
-            st.session_state.world_data = pd.concat([st.session_state.world_data, new_row], ignore_index=True)
-            
-            st.rerun()  # Refresh the app to reflect changes
-
-    # Redraw the map with updated data
-    for _, country in filtered_world.iterrows():
-        if country['NAME'] == selected_country or country['NAME'] == invaded_country:
-            color = "red"
+            # Record the merge; only the two affected countries are touched
+            try:
+                with trace.span("merge"):
+                    campaign.merge(selected_country, invaded_country, new_name)
+            except ValueError as e:
+                st.sidebar.error(str(e))
+            else:
+                rerun()  # Refresh the app to reflect changes
+
+    if delivery == "Live":
+        # The geometry is published once per view and state; reruns only send
+        # the highlight and the merge preview's name to the mounted map
+        server = payload_server()
+        trace.watch("payload_store", server.store)
+        # The payload follows the zoom the user has zoomed the map to
+        view_key, map_zoom = map_view(st.session_state, view, width, height, zoom)
+        with trace.span("publish"):
+            etag = publish_view(server.store, state, view, map_zoom)
+        labels = {}
+        if selected_country and invaded_country:
+            labels = dict.fromkeys([selected_country, invaded_country], f"{selected_country}-{invaded_country}")
+        args = map_args(server.url(etag), view, view_key, width, height, map_zoom, [selected_country, invaded_country], labels)
+        with trace.span("emit"), map_container:
+            live_map(args)
+        # The browser caches each payload, so it only counts the first time
+        seen = st.session_state.setdefault("seen_payloads", set())
+        sent = args_size(args) + (0 if etag in seen else server.store.encoded_size(etag))
+        seen.add(etag)
+    else:
+        tile_url = None
+        if vector_tiles:
+            # Imported here so the default path does not load the tile encoder
+            from tiles import TileLayer
+
+            # One tile layer per session, moved to the current state so only
+            # tiles touched by a merge, undo or load are cut again
+            if "tile_layer" not in st.session_state:
+                st.session_state.tile_layer = TileLayer(state)
+                st.session_state.tile_url = tile_server().register(st.session_state.tile_layer)
+            st.session_state.tile_layer.update(state)
+            tile_url = st.session_state.tile_url
+
+        # Reuse the rendered HTML while the map content is unchanged; the size
+        # only matters through the pyramid level its zoom selects. The cache is
+        # shared by every dataset, whose states all start at the same version
+        level = level_for_zoom(zoom)
+        view_key = (source, selected_continent, state.version, selected_country, invaded_country, level, tile_url)
+        trace.watch("render_cache", map_cache())
+        with trace.span("render"):
+            html = map_cache().get_or_render(
+                view_key, lambda: map_html(build_map(state, view, zoom, selected_country, invaded_country, tile_url))
+            )
+        trace.record("html_bytes", len(html))
+
+        map_container.empty()
+        with trace.span("emit"), map_container:
+            st.iframe(html, width=width, height=height + 10)
+        # Streamlit only re-sends an embedded page when its content or size changed
+        sent_key = (view_key, width, height)
+        sent = len(html) if sent_key != st.session_state.get("sent_view_key") else 0
+        st.session_state.sent_view_key = sent_key
+    st.sidebar.caption(f"Map data sent this interaction: {sent / 1e3:.1f} KB")
+    trace.record("map_bytes_sent", sent)
+    if trace is not NULL_TRACE:
+        trace.record("world_frame_bytes", frame_bytes(world))
+        trace.record("view_frame_bytes", frame_bytes(filtered_world))
+
+    # Campaign history: undo/redo and save/load of the merge log
+    st.sidebar.title("Campaign")
+    undo_column, redo_column = st.sidebar.columns(2)
+    if undo_column.button("Undo", disabled=not campaign.can_undo):
+        campaign.undo()
+        rerun()
+    if redo_column.button("Redo", disabled=not campaign.can_redo):
+        campaign.redo()
+        rerun()
+    st.sidebar.checkbox("Shared campaign", key="shared_campaign", help="Every session sees and edits the same world")
+    st.sidebar.download_button("Save campaign", campaign.to_json(), file_name="campaign.json", mime="application/json")
+    campaign_file = st.sidebar.file_uploader("Load campaign", type="json")
+    if campaign_file is not None and st.sidebar.button("Load"):
+        try:
+            loaded = campaign.replay(campaign_file.getvalue().decode())
+            if not shared:
+                st.session_state.campaign = loaded
+        except (ValueError, KeyError, TypeError) as e:
+            st.sidebar.error(f"Error loading campaign: {e}")
         else:
-            color = f"#{random.randint(0, 255):02x}{random.randint(0, 255):02x}{random.randint(0, 255):02x}"
-
-        folium.GeoJson(
-            country['geometry'],
-            style_function=lambda x, col=color: {
-                "fillColor": col, 
-                "color": "none" if country['NAME'] in [selected_country, invaded_country] else "black",  # Removes border for merged countries
-                "weight": 0 if country['NAME'] in [selected_country, invaded_country] else 1,
-                "fillOpacity": 0.7
-            },
-            tooltip=country['NAME']
-        ).add_to(m)
-    
-    # If invasion happened, display the new merged country
-    if merged_geometry is not None and new_name:
-        folium.GeoJson(
-            merged_geometry,
-            style_function=lambda x: {"fillColor": "red", "color": "none", "weight": 0, "fillOpacity": 0.7},
-            tooltip=new_name
-        ).add_to(m)
-
-    map_container.empty()
-    map_container = folium_static(m, width=1600 if fullscreen else 1200, height=900 if fullscreen else 800)
+            rerun()
     
+    if st.sidebar.checkbox("Show memory usage", value=False):
+        # Sessions only own their merge overlays; the base world and caches are shared
+        base_world = load_data(source)
+        skip = shared_memory(source)
+        campaigns = list(session_registry().values())
+        overlays = {id(c): deep_size(c, skip) for c in campaigns}
+        session_size = deep_size((campaign, view_index, st.session_state.get("tile_layer")), skip)
+        st.sidebar.write(f"Shared world: {shared_size(base_world, load_levels(source), load_unions(source)) / 1e6:.1f} MB")
+        st.sidebar.write(f"This session: {session_size / 1e3:.0f} KB")
+        st.sidebar.write(f"All sessions: {len(campaigns)} sessions, {sum(overlays.values()) / 1e3:.0f} KB of merge overlays")
+
+    # The debug panel shows this run up to here; drawing it is not timed
+    if st.sidebar.checkbox("Show debug panel", key="debug_panel"):
+        record = finish_trace()
+        st.sidebar.write(f"This run: {record['total_seconds'] * 1000:.0f} ms")
+        st.sidebar.dataframe(
+            {"stage": list(record["spans"]), "ms": [round(seconds * 1000, 1) for seconds in record["spans"].values()]},
+            hide_index=True,
+        )
+        st.sidebar.json({"counters": record["counters"], "values": record["values"]}, expanded=False)
+        st.sidebar.download_button(
+            "Download traces", to_json_lines(st.session_state.traces),
+            file_name="world4-traces.jsonl", mime="application/x-ndjson",
+        )
+
     st.sidebar.button("Exit App", on_click=lambda: os._exit(0))
+    finish_trace()
 else:
     st.error("Failed to load world data.")
 
@@ -0,0 +1,289 @@
+"""Local snapshot cache for the Natural Earth country data.
+
+The first load converts the source into a compact GeoParquet file holding
+only the columns the apps use. The source is streamed: a URL is downloaded
+to disk in chunks, and features are read in batches of the needed columns
+and written straight into the snapshot, so the raw document is never held
+in Python and the unused attribute columns of the 10m file are never
+materialized. Later loads memory-map the snapshot after
+checking it against the content hash recorded next to it, so startup works
+offline and does not re-parse the source.
+"""
+import hashlib
+import json
+import os
+
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyogrio
+import shapely
+
+# Natural Earth country files, by resolution
+NATURAL_EARTH_URL = "https://raw.githubusercontent.com/nvkelso/natural-earth-vector/master/geojson/ne_{resolution}_admin_0_countries.geojson"
+
+# Resolutions published by Natural Earth, coarsest first
+RESOLUTIONS = ["110m", "50m", "10m"]
+
+# URL for GeoJSON world data
+GEOJSON_URL = NATURAL_EARTH_URL.format(resolution="110m")
+
+# Columns kept in the snapshot
+COLUMNS = ["NAME", "ADMIN", "CONTINENT", "geometry"]
+
+# Columns a source must have; ADMIN falls back to NAME
+REQUIRED_COLUMNS = ["NAME", "CONTINENT"]
+
+# Features read and written per batch when building a snapshot
+BATCH_SIZE = 64
+
+# Snapshot location, overridable for read-only installs
+SNAPSHOT_DIR = os.environ.get(
+    "WORLD_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots"),
+)
+
+# Directory users may pick custom dataset files from
+CUSTOM_DATA_DIR = os.environ.get(
+    "WORLD_CUSTOM_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"),
+)
+
+
+def _is_url(source):
+    return source.startswith(("http://", "https://"))
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _write_atomic(path, write):
+    tmp_path = path + ".tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def resolution_source(resolution):
+    """Return the Natural Earth URL for a resolution such as ``"10m"``."""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution {resolution!r}; expected one of {', '.join(RESOLUTIONS)}")
+    return NATURAL_EARTH_URL.format(resolution=resolution)
+
+
+def custom_source(path, data_dir=CUSTOM_DATA_DIR):
+    """Return the full path of a user-chosen dataset file inside ``data_dir``.
+
+    URLs, files outside the directory and missing files raise ValueError, so
+    a shared server only ever reads files its operator put there.
+    """
+    if _is_url(path):
+        raise ValueError("Custom datasets must be local files, not URLs")
+    root = os.path.realpath(data_dir)
+    full_path = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full_path]) != root:
+        raise ValueError(f"Custom datasets must be in {root}")
+    if not os.path.isfile(full_path):
+        raise ValueError(f"No dataset file named {path!r} in {root}")
+    return full_path
+
+
+def default_source():
+    """Return the configured data source (local path or URL).
+
+    ``WORLD_DATA_SOURCE`` wins; otherwise the Natural Earth file for
+    ``WORLD_RESOLUTION`` (110m by default) is used.
+    """
+    return os.environ.get("WORLD_DATA_SOURCE") or resolution_source(os.environ.get("WORLD_RESOLUTION", "110m"))
+
+
+def _source_id(source):
+    return source if _is_url(source) else os.path.abspath(source)
+
+
+def snapshot_paths(source, snapshot_dir=SNAPSHOT_DIR):
+    """Return the (parquet, metadata) paths used for a source.
+
+    Files of the same name from different places, such as a local copy of a
+    Natural Earth file and its URL, get separate snapshots.
+    """
+    name = os.path.splitext(os.path.basename(source.rstrip("/")))[0]
+    digest = hashlib.sha1(_source_id(source).encode()).hexdigest()[:8]
+    base = os.path.join(snapshot_dir, f"{name}.{digest}")
+    return base + ".parquet", base + ".json"
+
+
+def read_meta(source, snapshot_dir=SNAPSHOT_DIR):
+    """Return the snapshot metadata for a source, or None if there is none."""
+    meta_path = snapshot_paths(source, snapshot_dir)[1]
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def compact(world):
+    """Keep only the columns the apps use, with normalized types."""
+    world = world[[column for column in COLUMNS if column in world.columns]].copy()
+    world["CONTINENT"] = world["CONTINENT"].astype(str)
+    if "ADMIN" not in world.columns:
+        world.insert(1, "ADMIN", world["NAME"])
+    if world.crs is None:
+        world = world.set_crs(epsg=4326)
+    elif world.crs.to_epsg() != 4326:
+        world = world.to_crs(epsg=4326)
+    return world.reset_index(drop=True)
+
+
+def _download(url, path):
+    """Stream ``url`` into ``path`` and return its SHA-256."""
+    import requests
+
+    digest = hashlib.sha256()
+    with requests.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(1 << 20):
+                digest.update(chunk)
+                f.write(chunk)
+    return digest.hexdigest()
+
+
+def read_batches(path, batch_size=BATCH_SIZE):
+    """Yield the features of ``path`` as compact GeoDataFrames of ``batch_size`` rows.
+
+    Only the snapshot columns are read, geometries are flattened to 2D, and
+    batches in another CRS are reprojected to WGS84 one at a time. Countries
+    are keyed by NAME everywhere, so a missing or repeated name is an error.
+    """
+    # Columns the source lacks are skipped by the reader; the source is
+    # parsed once, so they are checked against what it returned
+    columns = [column for column in COLUMNS if column != "geometry"]
+    with pyogrio.open_arrow(path, columns=columns, batch_size=batch_size, use_pyarrow=True) as (meta, reader):
+        missing = [column for column in REQUIRED_COLUMNS if column not in set(meta["fields"])]
+        if missing:
+            raise ValueError(f"{os.path.basename(path)} has no {', '.join(missing)} column")
+        geometry = meta["geometry_name"] or "wkb_geometry"
+        names = set()
+        for batch in reader:
+            table = pa.Table.from_batches([batch])
+            geoms = shapely.from_wkb(table.column(geometry).to_numpy(zero_copy_only=False))
+            if shapely.has_z(geoms).any():
+                geoms = shapely.force_2d(geoms)
+            frame = table.drop_columns([geometry]).to_pandas()
+            if frame["NAME"].isna().any():
+                raise ValueError(f"{os.path.basename(path)} has a feature without a NAME")
+            repeated = sorted(set(frame["NAME"][frame["NAME"].duplicated()]) | (names & set(frame["NAME"])))
+            if repeated:
+                raise ValueError(f"{os.path.basename(path)} has several features named {', '.join(repeated)}")
+            names.update(frame["NAME"])
+            yield compact(gpd.GeoDataFrame(frame, geometry=geoms, crs=meta["crs"] or "EPSG:4326"))
+
+
+def write_snapshot(batches, path):
+    """Write compact batches to a GeoParquet file; return the number of rows.
+
+    Geometries are stored as 2D WKB and strings dictionary-encoded, all
+    zstd-compressed, with GeoParquet metadata that ``read_snapshot`` and
+    ``geopandas.read_parquet`` both understand.
+    """
+    attributes = [column for column in COLUMNS if column != "geometry"]
+    geo = {"version": "1.0.0", "primary_column": "geometry", "columns": {"geometry": {"encoding": "WKB", "geometry_types": []}}}
+    schema = pa.schema(
+        [(column, pa.string()) for column in attributes] + [("geometry", pa.binary())],
+        metadata={"geo": json.dumps(geo)},
+    )
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for batch in batches:
+            columns = [pa.array(batch[column], pa.string(), from_pandas=True) for column in attributes]
+            columns.append(pa.array(shapely.to_wkb(batch.geometry.values), pa.binary()))
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            rows += len(batch)
+    if not rows:
+        raise ValueError(f"{os.path.basename(path)} has no features")
+    return rows
+
+
+def _is_fresh(source, meta, parquet_path):
+    if meta is None or not os.path.exists(parquet_path):
+        return False
+    if meta.get("source") != _source_id(source):
+        return False
+    if not _is_url(source) and os.path.exists(source):
+        # A local source may have been edited since the snapshot was made
+        if meta.get("source_stamp") != _file_stamp(source) and meta.get("source_sha256") != _file_sha256(source):
+            return False
+    return meta.get("snapshot_sha256") == _file_sha256(parquet_path)
+
+
+def build_snapshot(source=None, snapshot_dir=SNAPSHOT_DIR):
+    """Convert a GeoJSON (or other OGR) source into a snapshot and return the loaded frame."""
+    source = source or default_source()
+    parquet_path, meta_path = snapshot_paths(source, snapshot_dir)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    download_path = parquet_path + ".download"
+    try:
+        if _is_url(source):
+            source_sha256, path = _download(source, download_path), download_path
+        else:
+            source_sha256, path = _file_sha256(source), source
+        rows = write_snapshot(read_batches(path), parquet_path + ".tmp")
+        os.replace(parquet_path + ".tmp", parquet_path)
+    finally:
+        for leftover in (download_path, parquet_path + ".tmp"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    meta = {
+        "source": _source_id(source),
+        "source_sha256": source_sha256,
+        "source_stamp": None if _is_url(source) else _file_stamp(source),
+        "snapshot_sha256": _file_sha256(parquet_path),
+        "rows": rows,
+    }
+
+    def write_meta(path):
+        with open(path, "w") as f:
+            json.dump(meta, f, indent=2)
+
+    _write_atomic(meta_path, write_meta)
+    return read_snapshot(parquet_path)
+
+
+def read_snapshot(path):
+    """Memory-map a GeoParquet file written by this module.
+
+    Geometry columns are decoded straight from WKB with a fixed WGS84 CRS,
+    skipping pyproj's parse of the stored PROJJSON, which otherwise costs
+    more than reading the file itself.
+    """
+    table = pq.read_table(path, memory_map=True)
+    geo = json.loads(table.schema.metadata[b"geo"])
+    frame = table.drop_columns(list(geo["columns"])).to_pandas()
+    for name in geo["columns"]:
+        geoms = shapely.from_wkb(table.column(name).to_numpy(zero_copy_only=False))
+        frame[name] = gpd.GeoSeries(geoms, crs="EPSG:4326")
+    return gpd.GeoDataFrame(frame[table.column_names], geometry=geo["primary_column"], crs="EPSG:4326")
+
+
+def load_world(source=None, snapshot_dir=SNAPSHOT_DIR):
+    """Load the world GeoDataFrame, building the local snapshot if needed.
+
+    ``source`` defaults to ``WORLD_DATA_SOURCE`` or the Natural Earth URL.
+    The network is only touched when no valid snapshot exists yet.
+    """
+    source = source or default_source()
+    parquet_path = snapshot_paths(source, snapshot_dir)[0]
+    if _is_fresh(source, read_meta(source, snapshot_dir), parquet_path):
+        return read_snapshot(parquet_path)
+    return build_snapshot(source, snapshot_dir)